@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Compare a sharded walk with several processes to a single process walk.
+
+Usage: python benchmarks/sharded_scan.py [DIRECTORY]
+
+Without a directory an unbalanced synthetic tree is made in a temporary
+directory: one subtree holds half the directories. The filter is a query
+of name predicates, so the filters rather than the listings dominate.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from pathfinder import walk_and_filter
+from pathfinder.query import Query
+from pathfinder.sharded import sharded_walk_and_filter
+
+QUERY = "(name:*.log or name:*.txt or regex:.*/sub1[0-9]/.*) and not name:file1*"
+
+
+def make_tree(top, dirs=40, subdirs=20, files=60):
+    """Make a tree, with as many directories under dir0 as under the others."""
+    for number in range(dirs):
+        for subnumber in range(subdirs * (dirs - 1 if number == 0 else 1)):
+            directory = os.path.join(top, f"dir{number}", f"sub{subnumber}")
+            os.makedirs(directory)
+            for file_number in range(files):
+                name = f"file{file_number}.{('txt', 'log', 'dat')[file_number % 3]}"
+                with open(os.path.join(directory, name), "wb"):
+                    pass
+
+
+def main(top):
+    """Print the time and speed up of each number of processes."""
+    started = time.perf_counter()
+    expected = len(walk_and_filter(top, Query(QUERY).filter))
+    single = time.perf_counter() - started
+    print(f"{'processes':<10}{'paths':>10}{'seconds':>10}{'speed up':>10}")
+    print(f"{'-':<10}{expected:>10}{single:>10.2f}{1:>10.2f}")
+    for processes in sorted({1, 2, 4, os.cpu_count() or 1}):
+        started = time.perf_counter()
+        found = sum(1 for _ in sharded_walk_and_filter(top, QUERY, processes=processes))
+        seconds = time.perf_counter() - started
+        assert found == expected
+        print(f"{processes:<10}{found:>10}{seconds:>10.2f}{single / seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            make_tree(directory)
+            main(directory)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the cost per entry of the path modes of find_paths.
+
+Usage: python benchmarks/walk_modes.py [DIRECTORY]
+
+Without a directory a synthetic tree is made in a temporary directory. For
+each mode the time and the peak memory allocated while walking are printed,
+per path found.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathfinder import find_paths
+
+MODES = {
+    "default": {},
+    "abspath": {"abspath": True},
+    "relative": {"relative": True},
+    "bytes": {"bytes": True},
+    "bytes relative": {"bytes": True, "relative": True},
+}
+
+
+def make_tree(top, dirs=50, subdirs=10, files=40):
+    """Make a tree of dirs * subdirs directories of files files each."""
+    for number in range(dirs):
+        for subnumber in range(subdirs):
+            directory = os.path.join(top, f"dir{number}", f"sub{subnumber}")
+            os.makedirs(directory)
+            for file_number in range(files):
+                with open(os.path.join(directory, f"file{file_number}.txt"), "wb"):
+                    pass
+
+
+def measure(top, options):
+    """Return (paths, seconds, peak bytes) for one walk."""
+    options = dict(options)
+    if options.pop("bytes", False):
+        top = os.fsencode(top)
+    started = time.perf_counter()
+    find_paths(top, fnmatch="*.txt", **options)
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    paths = find_paths(top, fnmatch="*.txt", **options)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(paths), seconds, peak
+
+
+def main(top):
+    """Print the cost per entry of each mode."""
+    print(f"{'mode':<16}{'paths':>8}{'us/path':>10}{'peak B/path':>13}")
+    for mode, options in MODES.items():
+        count, seconds, peak = measure(top, options)
+        count = max(count, 1)
+        print(
+            f"{mode:<16}{count:>8}{seconds / count * 1e6:>10.2f}{peak / count:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            make_tree(directory)
+            main(directory)
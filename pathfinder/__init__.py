@@ -3,18 +3,54 @@
 
 import os
 
-from pathfinder import filters
+from pathfinder import filters, sources
+from pathfinder.pathset import PathSet
+from pathfinder.progress import reporting
 
 
-def walk_and_filter(filepath, pathfilter, ignore=None, abspath=None, depth=None):
-    """Walk the file tree and filter it's contents."""
+def walk_and_filter(
+    filepath,
+    pathfilter,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    pathset=None,
+    source=None,
+    progress=None,
+    relative=None,
+    one_filesystem=None,
+):
+    """
+    Walk the file tree and filter it's contents.
+
+    A list of the paths is returned, or a PathSet if pathset is True.
+    """
     if not os.path.exists(filepath):
         raise EnvironmentError(filepath)
-    return list(walk_and_filter_generator(filepath, pathfilter, ignore, abspath, depth))
+    paths = walk_and_filter_generator(
+        filepath,
+        pathfilter,
+        ignore,
+        abspath,
+        depth,
+        source,
+        progress,
+        relative,
+        one_filesystem,
+    )
+    return PathSet(paths) if pathset else list(paths)
 
 
 def walk_and_filter_generator(  # noqa:C901
-    filepath, pathfilter, ignore=None, abspath=None, depth=None
+    filepath,
+    pathfilter,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    source=None,
+    progress=None,
+    relative=None,
+    one_filesystem=None,
 ):
     """
     Walk the file tree and filter it's contents.
@@ -24,63 +60,460 @@ def walk_and_filter_generator(  # noqa:C901
     To return absolute paths pass True for the abspath parameter.
 
     To limit how deep into the tree you travel, specify the depth parameter.
+
+    To list directories from somewhere other than the file system, such as
+    inside archives with sources.ArchiveSource, specify the source parameter.
+
+    To follow the walk's progress pass a progress.Progress for progress.
+
+    To return the paths relative to filepath pass True for relative. They
+    are made by adding each name to its directory's relative path, without
+    joining or normalising each path. The filters still see the same paths
+    as without relative.
+
+    To walk with bytes paths, as os.scandir does for a bytes path, pass
+    filepath as bytes, such as os.fsencode(filepath). Names that are not
+    valid in the file system encoding are then kept as they are, and every
+    path found is bytes.
+
+    To stay on the file system filepath is on, like find -xdev, pass True
+    for one_filesystem. Mount points are found, but not descended into.
     """
     # by default no depth limit is enforced
     depth = -1 if depth is None else int(depth)
     if abspath is None:
         abspath = False
+    if abspath and relative:
+        raise ValueError("abspath and relative cannot both be True")
 
     base_path = _get_base_path(filepath)
 
-    for root, dirs, files in os.walk(base_path):
-        # descend the tree to a certain depth
-        if _is_not_accepted_depth(root, base_path, depth):
-            break
+    stack = [base_path]
+    device = _get_device(base_path) if one_filesystem else None
+    try:
+        for root, dirs, files, entries in _walk(base_path, source, stack, device):
+            # descend the tree to a certain depth
+            if _is_not_accepted_depth(root, base_path, depth):
+                break
 
-        yield from _process_tree(
-            dirs, ignore, root, pathfilter, abspath, base_path, files
-        )
+            if relative:
+                accepted = _process_tree_relative(
+                    dirs,
+                    ignore,
+                    root,
+                    pathfilter,
+                    _get_relative_prefix(root, base_path),
+                    files,
+                    entries,
+                    progress,
+                )
+            else:
+                accepted = _process_tree(
+                    dirs,
+                    ignore,
+                    root,
+                    pathfilter,
+                    abspath,
+                    base_path,
+                    files,
+                    entries,
+                    progress,
+                )
+            if progress is not None:
+                accepted = list(accepted)
+                progress.directory(
+                    _get_depth(root, base_path), len(entries), len(accepted), len(stack)
+                )
+            yield from accepted
+    finally:
+        if progress is not None:
+            progress.finish()
+
+
+def walk_and_filter_many(
+    filepath,
+    pathfilters,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    limit=None,
+    source=None,
+    progress=None,
+    one_filesystem=None,
+):
+    """
+    Walk the file tree once and filter it's contents with several filters.
+
+    pathfilters maps a query name to the Filter for that query. A dict
+    mapping each name to the list of paths its filter accepted is returned.
+    """
+    if not os.path.exists(filepath):
+        raise EnvironmentError(filepath)
+    results = {name: [] for name in pathfilters}
+    for name, path in walk_and_filter_many_generator(
+        filepath,
+        pathfilters,
+        ignore,
+        abspath,
+        depth,
+        limit,
+        source,
+        progress,
+        one_filesystem,
+    ):
+        results[name].append(path)
+    return results
 
 
-def _process_tree(dirs, ignore, root, pathfilter, abspath, base_path, files):
+def walk_and_filter_many_generator(
+    filepath,
+    pathfilters,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    limit=None,
+    source=None,
+    progress=None,
+    one_filesystem=None,
+):
+    """
+    Walk the file tree once, yielding (name, path) for each query accepting path.
+
+    Each entry is listed and stat-ed once no matter how many of the filters
+    look at it.
+
+    To cap the number of paths found for a query specify the limit parameter,
+    either as one number for every query or as a dict of per-query limits.
+    The walk stops as soon as every query has reached its limit.
+
+    To follow the walk's progress pass a progress.Progress for progress.
+
+    To stay on the file system filepath is on pass True for one_filesystem.
+    """
+    depth = -1 if depth is None else int(depth)
+    if abspath is None:
+        abspath = False
+
+    remaining = _get_limits(pathfilters, limit)
+    queries = [(name, pathfilter) for name, pathfilter in pathfilters.items()]
+    base_path = _get_base_path(filepath)
+    stack = [base_path]
+    device = _get_device(base_path) if one_filesystem else None
+
+    try:
+        for root, dirs, files, entries in _walk(base_path, source, stack, device):
+            if _is_not_accepted_depth(root, base_path, depth) or not queries:
+                break
+
+            accepted = list(
+                _process_tree_many(
+                    dirs,
+                    ignore,
+                    root,
+                    queries,
+                    abspath,
+                    base_path,
+                    files,
+                    entries,
+                    progress,
+                )
+            )
+            if progress is not None:
+                progress.directory(
+                    _get_depth(root, base_path), len(entries), len(accepted), len(stack)
+                )
+            for name, path in accepted:
+                if remaining.get(name, 1) > 0:
+                    yield name, path
+                    if name in remaining:
+                        remaining[name] -= 1
+            # stop evaluating the queries that have found enough paths
+            queries = [query for query in queries if remaining.get(query[0], 1) > 0]
+    finally:
+        if progress is not None:
+            progress.finish()
+
+
+def _get_limits(pathfilters, limit):
+    """Return a dict of the number of paths each limited query may still find."""
+    if limit is None:
+        return {}
+    if isinstance(limit, dict):
+        return {
+            name: limit[name] for name in pathfilters if limit.get(name) is not None
+        }
+    return {name: limit for name in pathfilters}
+
+
+def _walk(top, source=None, stack=None, device=None):
+    """
+    Walk the tree rooted at top like os.walk, keeping the os.DirEntry objects.
+
+    Yield (root, dirs, files, entries) for each directory, where entries maps
+    every name in dirs and files to its os.DirEntry. As with os.walk the
+    caller may reorder or remove names in dirs to control the descent.
+
+    The directories are listed by source, the file system by default.
+
+    To start from a saved frontier pass the list of directories still to be
+    walked as stack, top is then ignored. The list is the walk's own stack,
+    so the caller can save it to resume the walk later.
+
+    To only descend into directories on one device pass its st_dev as device.
+    """
+    source = source or sources.FileSystemSource()
+    if stack is None:
+        stack = [top]
+    while stack:
+        root = stack.pop()
+        listed = _list_dir(source, root)
+        if listed is None:
+            continue
+        dirs, files, entries = listed
+
+        yield root, dirs, files, entries
+
+        for adir in reversed(dirs):
+            if _is_descended(entries[adir], device):
+                stack.append(os.path.join(root, adir))
+
+
+def _walk_sorted(
+    top, pathfilter, ignore=None, depth=-1, device=None, source=None, key=None
+):
+    """
+    Yield (path, entry) for the paths accepted under top, in sorted order.
+
+    Each directory's entries are sorted by name as it is listed, or by
+    key(name) if key is given, and a directory is descended into where its
+    name followed by a separator falls, so the depth first walk yields the
+    paths in order. Only the listings of the directories on the way down to
+    the current one are held.
+    """
+    source = source or sources.FileSystemSource()
+    args = (top, pathfilter, ignore, depth, device, source, key)
+    stack = [iter(_sorted_items(top, *args))]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+        elif item[3]:
+            stack.append(iter(_sorted_items(item[1], *args)))
+        else:
+            yield item[1], item[2]
+
+
+def _sorted_items(root, top, pathfilter, ignore, depth, device, source, key):
+    """
+    Return the sorted (key, path, entry, descend) items for the entries of root.
+
+    An entry has an item for itself if it is accepted, and a directory one,
+    keyed by its name and a separator, for descending into it.
+    """
+    listed = _list_dir(source, root)
+    if listed is None:
+        return []
+    dirs, files, entries = listed
+    dirpaths, files, filepaths, dir_masks, file_masks = _filter_tree(
+        root, dirs, files, entries, ignore, [pathfilter]
+    )
+    dir_mask, file_mask = dir_masks[0], file_masks[0]
+
+    sep = _get_sep(root)
+    descend = depth == -1 or _get_depth(root, top) + 1 < depth
+    items = []
+    for name, path, accepted in zip(dirs, dirpaths, dir_mask):
+        if accepted:
+            items.append((name, path, entries[name], False))
+        if descend and _is_descended(entries[name], device):
+            items.append((name + sep, path, entries[name], True))
+    items.extend(
+        (name, path, entries[name], False)
+        for name, path, accepted in zip(files, filepaths, file_mask)
+        if accepted
+    )
+    items.sort(key=lambda item: item[0] if key is None else key(item[0]))
+    return items
+
+
+def _list_dir(source, root):
+    """Return (dirs, files, entries) for root, listed by source, or None."""
+    try:
+        listing = source.scandir(root)
+    except OSError:
+        return None
+
+    dirs, files, entries = [], [], {}
+    for entry in listing:
+        entries[entry.name] = entry
+        try:
+            entry_is_dir = entry.is_dir()
+        except OSError:
+            entry_is_dir = False
+        (dirs if entry_is_dir else files).append(entry.name)
+    return dirs, files, entries
+
+
+def _is_descended(entry, device=None):
+    """Return whether the walk descends into the directory entry."""
+    # do not follow symbolic links to directories
+    if entry.is_symlink():
+        return False
+    if device is None:
+        return True
+    try:
+        return _get_device(entry) == device
+    except OSError:
+        return False
+
+
+def _get_device(path_or_entry):
+    """Return the st_dev of a path, or of an entry without following links."""
+    if isinstance(path_or_entry, (str, bytes)):
+        return os.stat(path_or_entry).st_dev
+    return path_or_entry.stat(follow_symlinks=False).st_dev
+
+
+def _process_tree(
+    dirs, ignore, root, pathfilter, abspath, base_path, files, entries, progress=None
+):
     """Process the files and dirs."""
     # process in order
-    ignored = []
     dirs.reverse()
-    for adir in dirs:
-        dirpath = os.path.normpath(os.path.join(root, adir))
-        if ignore and ignore.accepts(dirpath):
-            ignored.append(adir)
-        else:
-            yield from _assert_dir(pathfilter, dirpath, abspath, base_path)
+    dirpaths, files, filepaths, dir_masks, file_masks = _filter_tree(
+        root, dirs, files, entries, ignore, [pathfilter], progress
+    )
+    yield from _assert_dirs(dir_masks[0], dirpaths, abspath, base_path)
+    yield from _assert_files(file_masks[0], filepaths, abspath)
+
+
+def _process_tree_relative(
+    dirs, ignore, root, pathfilter, prefix, files, entries, progress=None
+):
+    """Process the files and dirs, yielding the accepted names added to prefix."""
+    dirs.reverse()
+    _, files, _, dir_masks, file_masks = _filter_tree(
+        root, dirs, files, entries, ignore, [pathfilter], progress
+    )
+    yield from (prefix + name for name, ok in zip(dirs, dir_masks[0]) if ok)
+    yield from (prefix + name for name, ok in zip(files, file_masks[0]) if ok)
+
+
+def _process_tree_many(
+    dirs, ignore, root, queries, abspath, base_path, files, entries, progress=None
+):
+    """Process the files and dirs, yielding (name, path) for each query."""
+    dirs.reverse()
+    dirpaths, files, filepaths, dir_masks, file_masks = _filter_tree(
+        root, dirs, files, entries, ignore, [query for _, query in queries], progress
+    )
+    for (name, _), mask in zip(queries, dir_masks):
+        for path in _assert_dirs(mask, dirpaths, abspath, base_path):
+            yield name, path
+    for (name, _), mask in zip(queries, file_masks):
+        for path in _assert_files(mask, filepaths, abspath):
+            yield name, path
+
+
+def _filter_tree(root, dirs, files, entries, ignore, pathfilters, progress=None):
+    """
+    Filter the names listed in root with ignore and each of pathfilters.
+
+    The ignored names are removed from dirs, and left out of the files
+    returned. Return (dirpaths, files, filepaths, dir_masks, file_masks), the
+    paths of the names kept and, for each of pathfilters, whether it accepts
+    each of them. The filters see the entries of the listing.
+    """
+    cache = {}
+    dirpaths = _tree_paths(root, dirs, entries, cache)
+    filepaths = _tree_paths(root, files, entries, cache)
+
+    with filters.entry_cache(cache), reporting(progress):
+        dirpaths = _prune_dirs(dirs, dirpaths, ignore, root)
+        files, filepaths = _skip_ignored(files, filepaths, ignore, root)
+        dir_masks = [
+            _accepts(pathfilter, root, dirs, dirpaths) for pathfilter in pathfilters
+        ]
+        file_masks = [
+            _accepts(pathfilter, root, files, filepaths) for pathfilter in pathfilters
+        ]
+    return dirpaths, files, filepaths, dir_masks, file_masks
+
+
+def _tree_paths(root, names, entries, cache):
+    """Return the paths of names in root, caching their entries by path."""
+    paths = filters.child_paths(root, names)
+    for name, path in zip(names, paths):
+        cache[path] = entries[name]
+    return paths
+
+
+def _accepts(pathfilter, root, names, paths):
+    """
+    Return whether pathfilter accepts each of paths, the paths of names in root.
+
+    The names are filtered in one batch if the filter supports it.
+    """
+    if filters.supports_batch(pathfilter):
+        return pathfilter.accepts_many(root, names)
+    return [pathfilter.accepts(path) for path in paths]
+
+
+def _prune_dirs(dirs, dirpaths, ignore, root):
+    """Return the dirpaths not ignored, removing the ignored ones from dirs."""
+    if not ignore:
+        return dirpaths
+    ignored = _accepts(ignore, root, dirs, dirpaths)
     # remove the dirs we are ignoring
-    for adir in ignored:
-        dirs.remove(adir)
+    dirs[:] = [adir for adir, is_ignored in zip(dirs, ignored) if not is_ignored]
+    return [path for path, is_ignored in zip(dirpaths, ignored) if not is_ignored]
+
 
-    for afile in files:
-        filepath = os.path.normpath(os.path.join(root, afile))
-        if not (ignore and ignore.accepts(filepath)):
-            yield from _assert_file(pathfilter, filepath, abspath)
+def _skip_ignored(files, filepaths, ignore, root):
+    """Return the files and filepaths not ignored."""
+    if not ignore:
+        return files, filepaths
+    ignored = _accepts(ignore, root, files, filepaths)
+    kept = [index for index, is_ignored in enumerate(ignored) if not is_ignored]
+    return [files[index] for index in kept], [filepaths[index] for index in kept]
 
 
 def _is_not_accepted_depth(root, base_path, depth):
     """Return if current level is past the accepted depth."""
-    level = len(root.split(base_path)[1].split(os.sep))
+    level = len(root.split(base_path)[1].split(_get_sep(root)))
     return level > depth and depth != -1
 
 
-def _assert_dir(pathfilter, dirpath, abspath, base_path):
-    """Assert the directory."""
-    if pathfilter.accepts(dirpath):
-        yield os.path.abspath(dirpath) if abspath else os.path.join(base_path, dirpath)
+def _get_depth(root, base_path):
+    """Return how many directories below base_path root is."""
+    sep = _get_sep(root)
+    return root.count(sep) - base_path.count(sep)
+
+
+def _get_sep(path):
+    """Return the path separator, as bytes if path is bytes."""
+    return os.fsencode(os.sep) if isinstance(path, bytes) else os.sep
 
 
-def _assert_file(pathfilter, filepath, abspath):
-    """Assert the file."""
-    if pathfilter.accepts(filepath):
-        if abspath:
-            filepath = os.path.abspath(filepath)
-        yield filepath
+def _get_relative_prefix(root, base_path):
+    """Return the path of root relative to base_path, ending in a separator."""
+    if root == base_path:
+        return root[:0]
+    return root[len(os.path.join(base_path, root[:0])) :] + _get_sep(root)
+
+
+def _assert_dirs(mask, dirpaths, abspath, base_path):
+    """Return the accepted directories."""
+    if abspath:
+        return [os.path.abspath(path) for path, ok in zip(dirpaths, mask) if ok]
+    return [os.path.join(base_path, path) for path, ok in zip(dirpaths, mask) if ok]
+
+
+def _assert_files(mask, filepaths, abspath):
+    """Return the accepted files."""
+    if abspath:
+        return [os.path.abspath(path) for path, ok in zip(filepaths, mask) if ok]
+    return [path for path, ok in zip(filepaths, mask) if ok]
 
 
 def _get_base_path(filepath):
@@ -106,8 +539,31 @@ def find_paths(
     ignore=None,
     abspath=None,
     depth=None,
+    pathset=None,
+    source=None,
+    progress=None,
+    relative=None,
+    one_filesystem=None,
+    processes=None,
 ):
-    """Find paths in the tree rooted at filepath."""
+    """
+    Find paths in the tree rooted at filepath.
+
+    To get the paths as a PathSet rather than a list pass True for pathset.
+
+    To find paths inside archives pass a sources.ArchiveSource for source.
+
+    To follow the walk's progress pass a progress.Progress for progress.
+
+    To get the paths relative to directory_path pass True for relative.
+
+    To stay on the file system directory_path is on pass True for
+    one_filesystem.
+
+    To walk with worker processes pass their number for processes, see
+    sharded.sharded_walk_and_filter. The paths are then in the order the
+    workers find them, and progress and relative are not supported.
+    """
     if just_dirs:
         path_filter = filters.DirectoryFilter()
     elif just_files:
@@ -121,4 +577,32 @@ def find_paths(
     else:
         path_filter = filter
 
-    return walk_and_filter(directory_path, path_filter, ignore, abspath, depth)
+    if processes:
+        if progress or relative:
+            raise ValueError("progress and relative cannot be used with processes")
+        from pathfinder.sharded import sharded_walk_and_filter
+
+        paths = sharded_walk_and_filter(
+            directory_path,
+            path_filter,
+            ignore,
+            abspath,
+            depth,
+            one_filesystem,
+            processes,
+            source=source,
+        )
+        return PathSet(paths) if pathset else list(paths)
+
+    return walk_and_filter(
+        directory_path,
+        path_filter,
+        ignore,
+        abspath,
+        depth,
+        pathset,
+        source,
+        progress,
+        relative,
+        one_filesystem,
+    )
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - cache directory listings between walks.
+
+A ListingCache is a source that remembers the listings of the directories
+it lists. A listing is reused while the directory's inode and mtime are
+unchanged, which holds while no entry is added, removed or renamed, so a
+repeated walk costs one stat per directory rather than a listing:
+
+    cache = ListingCache(max_entries=1_000_000, ttl=60)
+    paths = find_paths("/srv/static", fnmatch="*.css", source=cache)
+
+Only the names and types of the entries are cached. Their stat results are
+not, as a file's size and times change without its directory changing.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from pathfinder.sources import FileSystemSource
+
+CacheStats = namedtuple(
+    "CacheStats", "hits misses invalidations evictions listings entries"
+)
+CacheStats.__doc__ = """
+The counts of a ListingCache.
+
+invalidations counts the misses of listings cached before their directory
+changed, or their ttl passed. listings and entries are the number of
+listings cached and of entries in them.
+"""
+
+
+class ListingCache:
+    """
+    A thread safe source caching the listings of another source.
+
+    At most max_entries entries are kept, in total over all the listings,
+    evicting the least recently used listings first. A listing is at most
+    ttl seconds old if given. A directory modified less than min_age seconds
+    ago is listed but not cached, as a change within the resolution of its
+    mtime could go unnoticed. When several threads miss the same directory
+    at once it is listed once, and they all get that listing.
+
+    Directories that cannot be stat-ed, such as those inside archives, and
+    listings whose entries are read through the source are not cached. A
+    pickled cache, such as the copy each worker of a sharded walk has, starts
+    empty.
+    """
+
+    def __init__(self, source=None, max_entries=100000, ttl=None, min_age=1.0):
+        """Initialise an empty cache over source, the file system by default."""
+        self.source = source or FileSystemSource()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_age = min_age
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._entries = 0
+        # dirpath: (key, listed at, names and types), least recently used first
+        self._listings = OrderedDict()
+        # dirpath: the _Flight listing it
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Return the state to pickle, without the listings or the counts."""
+        state = self.__dict__.copy()
+        del state["_listings"], state["_flights"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state, as an empty cache."""
+        self.__dict__.update(state)
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+        self._entries = 0
+        self._listings = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def scandir(self, dirpath):
+        """Return the entries of dirpath, from the cache if it is unchanged."""
+        try:
+            stat = os.stat(dirpath)
+        except OSError:
+            return self.source.scandir(dirpath)
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+        with self._lock:
+            listing = self._lookup(dirpath, key)
+            if listing is not None:
+                return _entries(dirpath, listing)
+            flight = self._flights.get(dirpath)
+            leader = flight is None or flight.key != key
+            if leader:
+                flight = self._flights[dirpath] = _Flight(key)
+
+        if not leader:
+            listing = flight.wait()
+            if listing is None:
+                return self.source.scandir(dirpath)
+            return _entries(dirpath, listing)
+        return self._list(dirpath, stat, flight)
+
+    def stats(self):
+        """Return the CacheStats of the cache."""
+        with self._lock:
+            return CacheStats(
+                self.hits,
+                self.misses,
+                self.invalidations,
+                self.evictions,
+                len(self._listings),
+                self._entries,
+            )
+
+    @property
+    def hit_rate(self):
+        """Return the fraction of listings found in the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Forget every listing."""
+        with self._lock:
+            self._listings.clear()
+            self._entries = 0
+
+    def _lookup(self, dirpath, key):
+        """
+        Return the cached listing of dirpath if it is still valid, or None.
+
+        Count the lookup, holding the lock.
+        """
+        cached = self._listings.get(dirpath)
+        if cached is not None:
+            if cached[0] == key and (
+                self.ttl is None or time.monotonic() - cached[1] < self.ttl
+            ):
+                self._listings.move_to_end(dirpath)
+                self.hits += 1
+                return cached[2]
+            self._remove(dirpath)
+            self.invalidations += 1
+        self.misses += 1
+        return None
+
+    def _list(self, dirpath, stat, flight):
+        """List dirpath for the threads waiting on flight, and cache it."""
+        try:
+            entries = self.source.scandir(dirpath)
+            listing = None
+            if not any(hasattr(entry, "open") for entry in entries):
+                listing = _listing(entries)
+        except BaseException as error:
+            with self._lock:
+                self._land(dirpath, flight)
+            flight.fail(error)
+            raise
+        flight.succeed(listing)
+        # the flight is kept until the listing is stored, so a thread missing
+        # dirpath meanwhile waits for it rather than listing it again
+        with self._lock:
+            if listing is not None and time.time() - stat.st_mtime >= self.min_age:
+                self._store(dirpath, flight.key, listing)
+            self._land(dirpath, flight)
+        return entries
+
+    def _store(self, dirpath, key, listing):
+        """Cache listing, evicting the least recently used listings, holding the lock."""
+        if len(listing) > self.max_entries:
+            return
+        if dirpath in self._listings:
+            self._remove(dirpath)
+        self._listings[dirpath] = (key, time.monotonic(), listing)
+        self._entries += len(listing)
+        while self._entries > self.max_entries:
+            self._remove(next(iter(self._listings)))
+            self.evictions += 1
+
+    def _land(self, dirpath, flight):
+        """Remove flight, if it is still the one listing dirpath, holding the lock."""
+        if self._flights.get(dirpath) is flight:
+            del self._flights[dirpath]
+
+    def _remove(self, dirpath):
+        """Remove the listing of dirpath, holding the lock."""
+        self._entries -= len(self._listings.pop(dirpath)[2])
+
+
+class _Flight:
+    """A listing in progress, that other threads missing it wait for."""
+
+    def __init__(self, key):
+        """Initialise the flight for the directory version key."""
+        self.key = key
+        self._done = threading.Event()
+        self._listing = None
+        self._error = None
+
+    def succeed(self, listing):
+        """Hand listing to the waiting threads."""
+        self._listing = listing
+        self._done.set()
+
+    def fail(self, error):
+        """Hand error to the waiting threads."""
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        """Return the listing once it is done, or raise its error."""
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._listing
+
+
+def _listing(entries):
+    """Return the (name, is_dir, is_file, is_symlink, inode) of entries."""
+    listing = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        try:
+            is_file = entry.is_file()
+        except OSError:
+            is_file = False
+        inode = entry.inode() if hasattr(entry, "inode") else 0
+        listing.append((entry.name, is_dir, is_file, entry.is_symlink(), inode))
+    return tuple(listing)
+
+
+def _entries(dirpath, listing):
+    """Return new entries for a cached listing of dirpath."""
+    prefix = os.path.join(dirpath, dirpath[:0])
+    return [_CachedEntry(prefix, *item) for item in listing]
+
+
+class _CachedEntry:
+    """An entry of a cached listing, whose stat is read on demand."""
+
+    __slots__ = (
+        "name",
+        "path",
+        "_is_dir",
+        "_is_file",
+        "_is_symlink",
+        "_inode",
+        "_stat",
+    )
+
+    def __init__(self, prefix, name, is_dir, is_file, is_symlink, inode):
+        """Initialise the entry for name in the directory prefix."""
+        self.name = name
+        self.path = prefix + name
+        self._is_dir = is_dir
+        self._is_file = is_file
+        self._is_symlink = is_symlink
+        self._inode = inode
+        self._stat = {}
+
+    def is_dir(self, follow_symlinks=True):
+        """Return whether the entry is a directory."""
+        if follow_symlinks or not self._is_symlink:
+            return self._is_dir
+        return False
+
+    def is_file(self, follow_symlinks=True):
+        """Return whether the entry is a file."""
+        if follow_symlinks or not self._is_symlink:
+            return self._is_file
+        return False
+
+    def is_symlink(self):
+        """Return whether the entry is a symbolic link."""
+        return self._is_symlink
+
+    def inode(self):
+        """Return the inode number of the entry."""
+        return self._inode
+
+    def stat(self, follow_symlinks=True):
+        """Return the stat of the entry, read the first time it is asked for."""
+        if follow_symlinks not in self._stat:
+            self._stat[follow_symlinks] = os.stat(
+                self.path, follow_symlinks=follow_symlinks
+            )
+        return self._stat[follow_symlinks]
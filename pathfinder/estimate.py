@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - estimate how many paths a filter accepts, without a full walk.
+
+Each sample is a random descent from the top directory, the estimator of
+Knuth's "Estimating the efficiency of backtrack programs": a directory with
+n subdirectories stands for n times as much of the tree as each of them, so
+the paths accepted in a directory are weighted by the product of the number
+of subdirectories of the directories above it. The average over the samples
+is an unbiased estimate of the total, and its spread gives the confidence
+interval.
+"""
+import os
+import random
+import time
+from collections import namedtuple
+from statistics import NormalDist
+
+from pathfinder import _filter_tree, _get_base_path, _list_dir, filters, sources
+
+Estimate = namedtuple("Estimate", "count size samples listings")
+Estimate.__doc__ = """The estimated count and total size of the accepted paths."""
+
+Interval = namedtuple("Interval", "estimate low high")
+Interval.__doc__ = """An estimate, and the ends of its confidence interval."""
+
+
+def estimate_paths(
+    directory_path,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    depth=None,
+    samples=1000,
+    max_seconds=None,
+    max_listings=None,
+    confidence=0.95,
+    seed=None,
+    source=None,
+):
+    """
+    Estimate the number of paths accepted by filter, and the bytes in them.
+
+    Up to samples random descents are made, stopping early when max_seconds
+    have passed or max_listings directories have been listed. A descent
+    the budget interrupts is left out. Directories are only listed once,
+    however many descents pass through them.
+
+    Return an Estimate of Intervals for the count and size, all paths by
+    default, with the confidence interval for confidence, and the number of
+    samples and listings it took. Pass seed for repeatable estimates.
+    """
+    if not os.path.exists(directory_path):
+        raise EnvironmentError(directory_path)
+    depth = -1 if depth is None else int(depth)
+    pathfilter = filter or filters.AlwaysAcceptFilter()
+    sampler = _Sampler(_get_base_path(directory_path), pathfilter, ignore, source)
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    budget = _Budget(deadline, max_listings)
+    rng = random.Random(seed)
+
+    counts, sizes = [], []
+    for _ in range(samples):
+        result = sampler.descend(rng, depth, budget)
+        if result is None:
+            break
+        counts.append(result[0])
+        sizes.append(result[1])
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return Estimate(
+        _interval(counts, z), _interval(sizes, z), len(counts), sampler.listings
+    )
+
+
+class _Budget:
+    """The time and number of listings an estimate may take."""
+
+    def __init__(self, deadline, max_listings):
+        """Initialise the budget."""
+        self.deadline = deadline
+        self.max_listings = max_listings
+
+    def allows(self, listings):
+        """Return whether another listing is allowed after listings."""
+        if self.max_listings is not None and listings >= self.max_listings:
+            return False
+        return self.deadline is None or time.monotonic() < self.deadline
+
+
+class _Sampler:
+    """Make random descents, remembering the directories listed."""
+
+    def __init__(self, base_path, pathfilter, ignore, source):
+        """Initialise the sampler."""
+        self.base_path = base_path
+        self.pathfilter = pathfilter
+        self.ignore = ignore
+        self.source = source or sources.FileSystemSource()
+        self.listings = 0
+        # (count, size, subdirectories) by directory
+        self._visited = {}
+
+    def descend(self, rng, depth, budget):
+        """Return the weighted (count, size) of a descent, or None if over budget."""
+        dirpath, weight, level = self.base_path, 1, 1
+        count = size = 0
+        while True:
+            visit = self._visited.get(dirpath)
+            if visit is None:
+                if not budget.allows(self.listings):
+                    return None
+                visit = self._visited[dirpath] = self._visit(dirpath)
+            dir_count, dir_size, subdirs = visit
+            count += weight * dir_count
+            size += weight * dir_size
+            level += 1
+            if not subdirs or (depth != -1 and level > depth):
+                return count, size
+            weight *= len(subdirs)
+            dirpath = rng.choice(subdirs)
+
+    def _visit(self, dirpath):
+        """Return the count and size accepted in dirpath, and its subdirectories."""
+        self.listings += 1
+        listed = _list_dir(self.source, dirpath)
+        if listed is None:
+            return 0, 0, []
+        dirs, files, entries = listed
+        dirpaths, files, _, dir_masks, file_masks = _filter_tree(
+            dirpath, dirs, files, entries, self.ignore, [self.pathfilter]
+        )
+        dir_mask, file_mask = dir_masks[0], file_masks[0]
+        size = sum(_size(entries[name]) for name, ok in zip(files, file_mask) if ok)
+        # do not follow symbolic links to directories, as the walker
+        subdirs = [
+            path for name, path in zip(dirs, dirpaths) if not entries[name].is_symlink()
+        ]
+        return sum(dir_mask) + sum(file_mask), size, subdirs
+
+
+def _size(entry):
+    """Return the size of the file entry, 0 if it cannot be stat-ed."""
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return 0
+
+
+def _interval(values, z):
+    """Return the Interval for the mean of values."""
+    if not values:
+        return Interval(0.0, 0.0, float("inf"))
+    count = len(values)
+    mean = sum(values) / count
+    if count < 2:
+        return Interval(mean, 0.0, float("inf"))
+    variance = sum((value - mean) ** 2 for value in values) / (count - 1)
+    margin = z * (variance / count) ** 0.5
+    return Interval(mean, max(0.0, mean - margin), mean + margin)
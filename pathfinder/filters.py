@@ -1,13 +1,142 @@
 # -*- coding: utf-8 -*-
 """pathfinder - making it easy to find paths."""
+import contextlib
+import contextvars
 import fnmatch as fnmatch_module
+import functools
 import os
 import re
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from math import sqrt
 
+from pathfinder.progress import current_progress, record_read
+
+# the os.DirEntry objects of the directory the walker is currently filtering,
+# keyed by path, so filters can share the walker's stat results
+_ENTRIES = contextvars.ContextVar("pathfinder_entries", default=None)
+
+
+@contextlib.contextmanager
+def entry_cache(entries):
+    """Make entries, a dict of path to os.DirEntry, available to the filters."""
+    token = _ENTRIES.set(entries)
+    try:
+        yield entries
+    finally:
+        _ENTRIES.reset(token)
+
+
+def _get_entry(filepath):
+    """Return the cached entry for filepath, or None if the walker has none."""
+    entries = _ENTRIES.get()
+    if entries is None:
+        return None
+    return entries.get(filepath)
+
+
+def get_stat(filepath):
+    """Return the stat of filepath, reusing the walker's cached stat if there is one."""
+    entry = _get_entry(filepath)
+    if entry is None:
+        return os.stat(filepath)
+    return entry.stat()
+
+
+def is_dir(filepath):
+    """Return whether filepath is a directory, using the walker's cached entry."""
+    entry = _get_entry(filepath)
+    if entry is None:
+        return os.path.isdir(filepath)
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def open_path(filepath):
+    """
+    Return filepath, or a file object if its contents are not on the file system.
+
+    The result can be passed to PIL's Image.open. A file object returned is
+    the caller's to close.
+    """
+    entry = _get_entry(filepath)
+    if entry is not None and hasattr(entry, "open"):
+        return entry.open()
+    return filepath
+
+
+def child_paths(dirpath, names):
+    """
+    Return the paths of names in dirpath.
+
+    The paths are the same as os.path.normpath(os.path.join(dirpath, name)),
+    but dirpath is only normalised once.
+    """
+    prefix = os.path.normpath(dirpath)
+    if prefix in (os.curdir, os.fsencode(os.curdir)):
+        return list(names)
+    prefix = os.path.join(prefix, prefix[:0])
+    return [prefix + name for name in names]
+
+
+def accepts_many(pathfilter, dirpath, names):
+    """Return whether pathfilter accepts each of names in dirpath."""
+    if supports_batch(pathfilter):
+        return pathfilter.accepts_many(dirpath, names)
+    return [pathfilter.accepts(path) for path in child_paths(dirpath, names)]
+
+
+def supports_batch(pathfilter):
+    """
+    Return whether pathfilter, and any filters it combines, has accepts_many.
+
+    A filter whose accepts is overridden by a subclass of the class its
+    accepts_many comes from, such as a subclass overriding only accepts, is
+    filtered a path at a time, as its accepts_many would not match.
+    """
+    if not getattr(pathfilter, "batch", False):
+        return False
+    return _batch_matches(type(pathfilter))
+
+
+@functools.lru_cache(maxsize=None)
+def _batch_matches(filter_class):
+    """Return whether accepts_many is defined with or below accepts in the MRO."""
+    defined = {}
+    for name in ("accepts", "accepts_many"):
+        for klass in filter_class.__mro__:
+            if name in vars(klass):
+                defined[name] = klass
+                break
+    return len(defined) == 2 and issubclass(defined["accepts_many"], defined["accepts"])
+
+
+def is_file(filepath):
+    """Return whether filepath is a regular file, using the walker's cached entry."""
+    entry = _get_entry(filepath)
+    if entry is None:
+        return os.path.isfile(filepath)
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
+
 
 class Filter:
-    """Base filter class."""
+    """
+    Base filter class.
+
+    A filter implements accepts(filepath). Filters that can also evaluate a
+    whole directory listing at once with accepts_many set batch to True, and
+    the walker then uses accepts_many for them. A subclass that overrides
+    only accepts is filtered a path at a time, see supports_batch.
+    """
+
+    batch = False
 
     def __and__(self, other):
         """Override dunder and."""
@@ -17,53 +146,95 @@ class Filter:
         """Override dunder or."""
         return OrFilter(self, other)
 
-    def find(self, filepath):
+    def find(self, filepath, source=None):
         """Walk the directory and try to find the filepath."""
         from pathfinder import walk_and_filter
 
-        return walk_and_filter(filepath, self)
+        return walk_and_filter(filepath, self, source=source)
+
+    def accepts_many(self, dirpath, names):
+        """Return a list of whether each of names in dirpath is accepted."""
+        return [self.accepts(path) for path in child_paths(dirpath, names)]
 
 
 class AlwaysAcceptFilter(Filter):
     """Accept every path."""
 
+    batch = True
+
     def accepts(self, _):
         """Return True always."""
         return True
 
+    def accepts_many(self, _, names):
+        """Return True for every name."""
+        return [True] * len(names)
+
 
 class DirectoryFilter(Filter):
     """Accept directory paths."""
 
+    batch = True
+
     def accepts(self, filepath):
         """Return True if filepath represents a directory."""
-        return os.path.isdir(filepath)
+        return is_dir(filepath)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether each of names in dirpath is a directory."""
+        return [is_dir(path) for path in child_paths(dirpath, names)]
 
 
 class FileFilter(Filter):
     """Accept file paths."""
 
+    batch = True
+
     def accepts(self, filepath):
         """Return True if filepath represents a file."""
-        return os.path.isfile(filepath)
+        return is_file(filepath)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether each of names in dirpath is a file."""
+        return [is_file(path) for path in child_paths(dirpath, names)]
 
 
 class RegexFilter(Filter):
     """Accept paths if they match the specified regular expression."""
 
+    batch = True
+
     def __init__(self, regex):
         """Initialize the filter with the specified regular expression."""
         super(RegexFilter, self).__init__()
         self.regex = re.compile(regex)
+        self._bytes_regex = None
 
     def accepts(self, filepath):
         """Return True if the regular expression matches the filepath."""
-        return self.regex.match(filepath) is not None
+        return self._get_regex(filepath).match(filepath) is not None
+
+    def accepts_many(self, dirpath, names):
+        """Return whether the regular expression matches each of names in dirpath."""
+        match = self._get_regex(dirpath).match
+        return [match(path) is not None for path in child_paths(dirpath, names)]
+
+    def _get_regex(self, filepath):
+        """Return the regular expression, compiled for bytes if filepath is bytes."""
+        if not isinstance(filepath, bytes) or isinstance(self.regex.pattern, bytes):
+            return self.regex
+        if self._bytes_regex is None:
+            self._bytes_regex = re.compile(
+                os.fsencode(self.regex.pattern), self.regex.flags & ~re.UNICODE
+            )
+        return self._bytes_regex
 
 
 class FnmatchFilter(Filter):
     """Accept paths if they match the specifed fnmatch pattern."""
 
+    batch = True
+
     def __init__(self, pattern):
         """Initialize the filter with the specified fnmatch pattern."""
         super(FnmatchFilter, self).__init__()
@@ -71,7 +242,126 @@ class FnmatchFilter(Filter):
 
     def accepts(self, filepath):
         """Return True if the fnmatch pattern matches the filepath."""
-        return fnmatch_module.fnmatch(filepath, self.pattern)
+        return fnmatch_module.fnmatch(filepath, _get_pattern(self.pattern, filepath))
+
+    def accepts_many(self, dirpath, names):
+        """Return whether the fnmatch pattern matches each of names in dirpath."""
+        paths = child_paths(dirpath, names)
+        pattern = _get_pattern(self.pattern, dirpath)
+        matched = set(fnmatch_module.filter(paths, pattern))
+        return [path in matched for path in paths]
+
+
+class NameFilter(Filter):
+    """Accept paths if their name, the last part, matches an fnmatch pattern."""
+
+    batch = True
+
+    def __init__(self, pattern):
+        """Initialize the filter with the specified fnmatch pattern."""
+        super(NameFilter, self).__init__()
+        self.pattern = pattern
+
+    def accepts(self, filepath):
+        """Return True if the fnmatch pattern matches the name of filepath."""
+        return fnmatch_module.fnmatch(
+            os.path.basename(filepath), _get_pattern(self.pattern, filepath)
+        )
+
+    def accepts_many(self, dirpath, names):
+        """Return whether the fnmatch pattern matches each of names."""
+        pattern = _get_pattern(self.pattern, dirpath)
+        matched = set(fnmatch_module.filter(names, pattern))
+        return [name in matched for name in names]
+
+
+def _get_pattern(pattern, filepath):
+    """Return the fnmatch pattern, encoded if filepath is bytes."""
+    if isinstance(filepath, bytes) and isinstance(pattern, str):
+        return os.fsencode(pattern)
+    return pattern
+
+
+# named groups of extensions, for ExtensionFilter(groups=...)
+EXTENSION_GROUPS = {
+    "images": ("bmp", "gif", "jpe", "jpeg", "jpg", "png", "tif", "tiff", "webp"),
+    "video": ("avi", "flv", "m4v", "mkv", "mov", "mp4", "mpeg", "mpg", "webm", "wmv"),
+    "archives": (
+        "7z",
+        "bz2",
+        "gz",
+        "rar",
+        "tar",
+        "tar.bz2",
+        "tar.gz",
+        "tar.xz",
+        "tbz2",
+        "tgz",
+        "txz",
+        "xz",
+        "zip",
+        "zst",
+    ),
+    "logs": ("log", "log.bz2", "log.gz", "log.xz"),
+}
+
+
+class ExtensionFilter(Filter):
+    """
+    Accept paths if their name ends with one of the extensions, in any case.
+
+    Extensions are given with or without the leading period, and may have
+    several parts, such as "tar.gz". groups names groups of EXTENSION_GROUPS
+    to accept as well. Each name is case folded once and its extensions are
+    looked up in a set, so the cost does not grow with the extensions.
+    """
+
+    batch = True
+
+    def __init__(self, *extensions, groups=()):
+        """Initialise the filter with the extensions to accept."""
+        super(ExtensionFilter, self).__init__()
+        if isinstance(groups, str):
+            groups = (groups,)
+        for group in groups:
+            if group not in EXTENSION_GROUPS:
+                raise ValueError(f"unknown extension group {group!r}")
+            extensions += tuple(EXTENSION_GROUPS[group])
+        self.extensions = frozenset(
+            extension.lstrip(".").casefold() for extension in extensions
+        )
+        self._bytes_extensions = frozenset(
+            os.fsencode(extension) for extension in self.extensions
+        )
+        # the most parts of any extension, how many suffixes of a name to try
+        self._parts = max(
+            (extension.count(".") + 1 for extension in self.extensions), default=0
+        )
+
+    def accepts(self, filepath):
+        """Return True if the name of filepath has one of the extensions."""
+        return self._matches(os.path.basename(filepath))
+
+    def accepts_many(self, _, names):
+        """Return whether each of names has one of the extensions."""
+        return [self._matches(name) for name in names]
+
+    def _matches(self, name):
+        """Return whether name has one of the extensions."""
+        if isinstance(name, bytes):
+            name, extensions, dot = name.lower(), self._bytes_extensions, b"."
+        else:
+            name, extensions, dot = name.casefold(), self.extensions, "."
+        end = len(name)
+        for _ in range(self._parts):
+            # a leading period starts a hidden name, not an extension
+            start = name.rfind(dot, 0, end)
+            if start <= 0:
+                return False
+            if name[start + 1 :] in extensions:
+                return True
+            end = start
+        return False
 
 
 class AndFilter(Filter, list):
@@ -85,6 +375,29 @@ class AndFilter(Filter, list):
         """Return True if all of the filters in this filter return True."""
         return all(sub_filter.accepts(filepath) for sub_filter in self)
 
+    @property
+    def batch(self):
+        """Return True if all of the filters are evaluated in batches."""
+        return all(supports_batch(sub_filter) for sub_filter in self)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether all of the filters accept each of names in dirpath."""
+        mask = [True] * len(names)
+        # only ask each filter about the names every filter before it accepted
+        indices = range(len(names))
+        for sub_filter in self:
+            if not indices:
+                break
+            sub_mask = accepts_many(sub_filter, dirpath, [names[i] for i in indices])
+            remaining = []
+            for index, accepted in zip(indices, sub_mask):
+                if accepted:
+                    remaining.append(index)
+                else:
+                    mask[index] = False
+            indices = remaining
+        return mask
+
 
 class OrFilter(Filter, list):
     """Accept paths if any of it's filters accept the path."""
@@ -97,6 +410,29 @@ class OrFilter(Filter, list):
         """Return True if any of the filters in this filter return True."""
         return any(sub_filter.accepts(filepath) for sub_filter in self)
 
+    @property
+    def batch(self):
+        """Return True if all of the filters are evaluated in batches."""
+        return all(supports_batch(sub_filter) for sub_filter in self)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether any of the filters accept each of names in dirpath."""
+        mask = [False] * len(names)
+        # only ask each filter about the names no filter before it accepted
+        indices = range(len(names))
+        for sub_filter in self:
+            if not indices:
+                break
+            sub_mask = accepts_many(sub_filter, dirpath, [names[i] for i in indices])
+            remaining = []
+            for index, accepted in zip(indices, sub_mask):
+                if accepted:
+                    mask[index] = True
+                else:
+                    remaining.append(index)
+            indices = remaining
+        return mask
+
 
 class NotFilter(Filter):
     """Negate the accept of the specified filter."""
@@ -110,6 +446,17 @@ class NotFilter(Filter):
         """Return True of the sub-filter returns False."""
         return not self.pathfilter.accepts(filepath)
 
+    @property
+    def batch(self):
+        """Return True if the negated filter is evaluated in batches."""
+        return supports_batch(self.pathfilter)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether the negated filter rejects each of names in dirpath."""
+        return [
+            not accepted for accepted in accepts_many(self.pathfilter, dirpath, names)
+        ]
+
 
 class DotDirectoryFilter(AndFilter):
     """Do not accept a path for a directory that begins with a period."""
@@ -137,10 +484,21 @@ class SizeFilter(FileFilter):
     def accepts(self, filepath):
         """Return True if the file size is within the range."""
         if super(SizeFilter, self).accepts(filepath):
-            stat = os.stat(filepath)
-            return self._has_gtr_min_bytes(stat) and self._has_lte_max_bytes(stat)
+            return self._in_range(get_stat(filepath))
         return False
 
+    def accepts_many(self, dirpath, names):
+        """Return whether each of names in dirpath is a file within the range."""
+        mask = super(SizeFilter, self).accepts_many(dirpath, names)
+        return [
+            is_a_file and self._in_range(get_stat(path))
+            for path, is_a_file in zip(child_paths(dirpath, names), mask)
+        ]
+
+    def _in_range(self, stat):
+        """Return whether the file size is within the range."""
+        return self._has_gtr_min_bytes(stat) and self._has_lte_max_bytes(stat)
+
     def _has_lte_max_bytes(self, stat):
         """Return whether the file size is less than or equal to the max size."""
         return self.max_bytes is None or stat.st_size <= self.max_bytes
@@ -150,33 +508,323 @@ class SizeFilter(FileFilter):
         return self.min_bytes is None or stat.st_size >= self.min_bytes
 
 
+class TimeFilter(Filter):
+    """Accept paths whose stat time is within an after and/or before range."""
+
+    # the os.stat_result attribute compared, in seconds since the epoch
+    attribute = "st_mtime"
+    batch = True
+
+    def __init__(self, after=None, before=None):
+        """Initialise the time filter with the range in seconds since the epoch."""
+        super(TimeFilter, self).__init__()
+        self.after = after
+        self.before = before
+
+    def accepts(self, filepath):
+        """Return True if the time of filepath is within the range."""
+        return self._in_range(filepath)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether the time of each of names in dirpath is within the range."""
+        return [self._in_range(path) for path in child_paths(dirpath, names)]
+
+    def _in_range(self, filepath):
+        """Return whether the time of filepath is within the range."""
+        try:
+            value = getattr(get_stat(filepath), self.attribute)
+        except OSError:
+            return False
+        return (self.after is None or value >= self.after) and (
+            self.before is None or value < self.before
+        )
+
+
+class ModifiedTimeFilter(TimeFilter):
+    """Accept paths modified within a time range."""
+
+    attribute = "st_mtime"
+
+
+class ChangedTimeFilter(TimeFilter):
+    """Accept paths whose status (ctime) changed within a time range."""
+
+    attribute = "st_ctime"
+
+
+class AccessedTimeFilter(TimeFilter):
+    """Accept paths accessed within a time range."""
+
+    attribute = "st_atime"
+
+
+class ChangedSinceFilter(Filter):
+    """Accept paths modified or changed at or after a point in time."""
+
+    batch = True
+
+    def __init__(self, since):
+        """Initialise the filter with the time in seconds since the epoch."""
+        super(ChangedSinceFilter, self).__init__()
+        self.since = since
+
+    def accepts(self, filepath):
+        """Return True if the mtime or ctime of filepath is not before since."""
+        return self._changed(filepath)
+
+    def accepts_many(self, dirpath, names):
+        """Return whether each of names in dirpath changed at or after since."""
+        return [self._changed(path) for path in child_paths(dirpath, names)]
+
+    def _changed(self, filepath):
+        """Return whether the mtime or ctime of filepath is not before since."""
+        try:
+            stat = get_stat(filepath)
+        except OSError:
+            return False
+        return stat.st_mtime >= self.since or stat.st_ctime >= self.since
+
+
+# (content type, ((offset, signature), ...)) for the content types sniffed
+CONTENT_SIGNATURES = (
+    ("image/jpeg", ((0, b"\xff\xd8\xff"),)),
+    ("image/png", ((0, b"\x89PNG\r\n\x1a\n"),)),
+    ("image/gif", ((0, b"GIF87a"),)),
+    ("image/gif", ((0, b"GIF89a"),)),
+    ("image/bmp", ((0, b"BM"),)),
+    ("image/tiff", ((0, b"II*\x00"),)),
+    ("image/tiff", ((0, b"MM\x00*"),)),
+    ("image/webp", ((0, b"RIFF"), (8, b"WEBP"))),
+    ("image/x-icon", ((0, b"\x00\x00\x01\x00"),)),
+    ("video/mp4", ((4, b"ftyp"),)),
+    ("audio/mpeg", ((0, b"ID3"),)),
+    ("application/pdf", ((0, b"%PDF-"),)),
+    ("application/zip", ((0, b"PK\x03\x04"),)),
+    ("application/gzip", ((0, b"\x1f\x8b"),)),
+    ("application/x-bzip2", ((0, b"BZh"),)),
+    ("application/x-xz", ((0, b"\xfd7zXZ\x00"),)),
+    ("application/x-tar", ((257, b"ustar"),)),
+    ("application/x-elf", ((0, b"\x7fELF"),)),
+)
+
+# the number of bytes read from the start of a file to sniff its content type
+SNIFF_SIZE = max(
+    offset + len(signature)
+    for _, signatures in CONTENT_SIGNATURES
+    for offset, signature in signatures
+)
+
+# sniffed content types by (device, inode, mtime, size)
+_content_types = OrderedDict()
+_content_types_lock = threading.Lock()
+_CONTENT_TYPES_SIZE = 65536
+
+
+def content_type(filepath):
+    """Return the content type of the file at filepath sniffed from it's first bytes."""
+    return _sniff(filepath, _cache_key(filepath), _opener(filepath), None)
+
+
+def _cache_key(filepath):
+    """Return the key to cache the content type of filepath by, or None."""
+    try:
+        stat = get_stat(filepath)
+    except OSError:
+        return None
+    # archive members have no inode
+    if not stat.st_ino:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _opener(filepath):
+    """Return the entry's open method if the contents are read through it."""
+    entry = _get_entry(filepath)
+    return getattr(entry, "open", None)
+
+
+def _sniff(filepath, key, opener, progress):
+    """
+    Return the content type of filepath, using and filling the cache.
+
+    The bytes read are counted to progress, or the walk's Progress if None.
+    """
+    if key is not None:
+        with _content_types_lock:
+            if key in _content_types:
+                _content_types.move_to_end(key)
+                return _content_types[key]
+    try:
+        head = _read_head(filepath, opener)
+    except OSError:
+        return None
+    record_read(len(head), progress)
+    found = None
+    for name, signatures in CONTENT_SIGNATURES:
+        if all(
+            head[offset : offset + len(signature)] == signature
+            for offset, signature in signatures
+        ):
+            found = name
+            break
+    if key is not None:
+        with _content_types_lock:
+            _content_types[key] = found
+            if len(_content_types) > _CONTENT_TYPES_SIZE:
+                _content_types.popitem(last=False)
+    return found
+
+
+def _read_head(filepath, opener):
+    """Return the first SNIFF_SIZE bytes of filepath."""
+    if opener is not None:
+        with opener() as contents:
+            return contents.read(SNIFF_SIZE)
+    if not hasattr(os, "pread"):
+        with open(filepath, "rb") as contents:
+            return contents.read(SNIFF_SIZE)
+    descriptor = os.open(filepath, os.O_RDONLY)
+    try:
+        return os.pread(descriptor, SNIFF_SIZE, 0)
+    finally:
+        os.close(descriptor)
+
+
+class ContentTypeFilter(Filter):
+    """
+    Accept files whose content type, sniffed from their first bytes, matches.
+
+    The content types are fnmatch patterns such as "image/*", matched against
+    the types in CONTENT_SIGNATURES. When a directory is filtered in one
+    batch, and has at least min_parallel files, its files are read in
+    parallel by a pool of worker threads. The pool is started for the first
+    such batch and kept for the next ones, until close is called or the
+    filter is garbage collected. The types found are cached by inode and
+    mtime.
+    """
+
+    batch = True
+
+    def __init__(self, *content_types, workers=8, min_parallel=16):
+        """Initialise the filter with the content type patterns to accept."""
+        super(ContentTypeFilter, self).__init__()
+        self.content_types = content_types
+        self.workers = workers
+        self.min_parallel = min_parallel
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Return the state to pickle, without the pool of threads."""
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state, without a pool of threads."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Shut down the pool of threads, it is started again if need be."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def accepts(self, filepath):
+        """Return True if filepath is a file with one of the content types."""
+        return is_file(filepath) and self._matches(content_type(filepath))
+
+    def accepts_many(self, dirpath, names):
+        """Return whether each of names in dirpath has one of the content types."""
+        paths = child_paths(dirpath, names)
+        # the cache keys, openers and progress come from the walker, which is
+        # not visible to the worker threads
+        progress = current_progress()
+        jobs = [
+            (path, _cache_key(path), _opener(path), progress) if is_file(path) else None
+            for path in paths
+        ]
+        files = [job for job in jobs if job is not None]
+        if self.workers > 1 and len(files) >= max(2, self.min_parallel):
+            executor = self._get_executor()
+            found = iter(list(executor.map(lambda job: _sniff(*job), files)))
+        else:
+            found = iter([_sniff(*job) for job in files])
+        return [job is not None and self._matches(next(found)) for job in jobs]
+
+    def _get_executor(self):
+        """Return the pool of threads, starting it if need be."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                # shut the pool down with the filter if close is not called
+                weakref.finalize(self, self._executor.shutdown, wait=False)
+            return self._executor
+
+    def _matches(self, found):
+        """Return whether the content type found matches."""
+        return found is not None and any(
+            fnmatch_module.fnmatchcase(found, pattern) for pattern in self.content_types
+        )
+
+
 class ImageFilter(Filter):
-    """Accept paths for Image files."""
+    """
+    Accept paths for Image files.
 
-    def __init__(self):
+    By default images are recognised by their extension, in any case, from
+    the "images" group of EXTENSION_GROUPS. To recognise them by their
+    contents instead, whatever their name, pass True for sniff. The image
+    filters that decode images then only decode files that are images.
+    """
+
+    batch = True
+
+    def __init__(self, sniff=None):
         """Initialise the image filter."""
-        self.file_filter = OrFilter(
-            FnmatchFilter("*.jpg"),
-            FnmatchFilter("*.jpeg"),
-            FnmatchFilter("*.png"),
-            FnmatchFilter("*.gif"),
-            FnmatchFilter("*.bmp"),
-            FnmatchFilter("*.tiff"),
-        )
+        if sniff:
+            self.file_filter = ContentTypeFilter("image/*")
+        else:
+            self.file_filter = ExtensionFilter(groups="images")
 
     def accepts(self, filepath):
-        """Return true if filepath has an image extension."""
-        return self.file_filter.accepts(filepath)
+        """Return true if filepath is an image that _decode accepts."""
+        return self.file_filter.accepts(filepath) and self._decode(filepath)
+
+    def accepts_many(self, dirpath, names):
+        """
+        Return whether each of names in dirpath is an image _decode accepts.
+
+        The file filter is evaluated for all of the names in one batch, then
+        only the images it accepts are decoded.
+        """
+        mask = accepts_many(self.file_filter, dirpath, names)
+        return [
+            accepted and self._decode(path)
+            for path, accepted in zip(child_paths(dirpath, names), mask)
+        ]
+
+    def _decode(self, filepath):
+        """Return True, the image filters that decode the image override this."""
+        return True
 
 
 class ImageDimensionFilter(ImageFilter):
     """Accept paths for Image files."""
 
     def __init__(
-        self, max_width=None, max_height=None, min_width=None, min_height=None
+        self,
+        max_width=None,
+        max_height=None,
+        min_width=None,
+        min_height=None,
+        sniff=None,
     ):
         """Initialise the image dimension filter."""
-        super(ImageDimensionFilter, self).__init__()
+        super(ImageDimensionFilter, self).__init__(sniff)
 
         if min_height is None:
             min_height = 0
@@ -188,42 +836,37 @@ class ImageDimensionFilter(ImageFilter):
         self.min_width = min_width
         self.min_height = min_height
 
-    def accepts(self, filepath):
-        """Return True if filepath satisfies the image constraints."""
-        if super(ImageDimensionFilter, self).accepts(filepath):
-            if (
-                self.min_height == 0
-                and self.min_width == 0
-                and self.max_height is None
-                and self.max_width is None
-            ):
-                return True
-
-            from PIL import Image
+    def _decode(self, filepath):
+        """Return True if the image at filepath satisfies the constraints."""
+        if (
+            self.min_height == 0
+            and self.min_width == 0
+            and self.max_height is None
+            and self.max_width is None
+        ):
+            return True
 
-            image = Image.open(filepath)
+        with _open_image(filepath) as image:
             size = image.size
-            if self.max_width and size[0] > self.max_width:
-                return False
-            if self.max_height and size[1] > self.max_height:
-                return False
-            if self.min_width and size[0] < self.min_width:
-                return False
-            if self.min_height and size[1] < self.min_height:
-                return False
-            return True
-        return False
+        if self.max_width and size[0] > self.max_width:
+            return False
+        if self.max_height and size[1] > self.max_height:
+            return False
+        if self.min_width and size[0] < self.min_width:
+            return False
+        if self.min_height and size[1] < self.min_height:
+            return False
+        return True
 
 
 class GreyscaleImageFilter(ImageFilter):
     """Accept black and white images."""
 
-    def accepts(self, filepath):
-        """Return true if the file located at filepath is a greyscale image."""
-        if super(GreyscaleImageFilter, self).accepts(filepath):
-            from PIL import Image, ImageStat
+    def _decode(self, filepath):
+        """Return true if the image located at filepath is greyscale."""
+        from PIL import ImageStat
 
-            image = Image.open(filepath)
+        with _open_image(filepath) as image:
             palette = image.getpalette()
 
             if palette:
@@ -234,22 +877,20 @@ class GreyscaleImageFilter(ImageFilter):
             # B&W JPEG: 8-bit pixels, black and white
             if image.mode == "L":
                 return True
-            # if the standard deviation of the mean is less than 1 we say it's a greyscale image
-            # where mean = average (arithmetic mean) pixel level for each band in the image.
-            # note we ignore alpha bands here
-            return stdv(stat.mean[:3]) < 1
-        return False
+        # if the standard deviation of the mean is less than 1 we say it's a greyscale image
+        # where mean = average (arithmetic mean) pixel level for each band in the image.
+        # note we ignore alpha bands here
+        return stdv(stat.mean[:3]) < 1
 
 
 class ColorImageFilter(ImageFilter):
     """Accept colour images."""
 
-    def accepts(self, filepath):
-        """Return True if the file at filepath is a colour image."""
-        if super(ColorImageFilter, self).accepts(filepath):
-            from PIL import Image, ImageStat
+    def _decode(self, filepath):
+        """Return True if the image at filepath is in colour."""
+        from PIL import ImageStat
 
-            image = Image.open(filepath)
+        with _open_image(filepath) as image:
             palette = image.getpalette()
 
             if palette:
@@ -261,11 +902,28 @@ class ColorImageFilter(ImageFilter):
             if image.mode == "L":
                 return False
 
-            # if the standard deviation of the mean is more than 1 we say it's a color image
-            # where mean = average (arithmetic mean) pixel level for each band in the image.
-            # note we ignore alpha bands here
-            return stdv(stat.mean[:3]) > 1
-        return False
+        # if the standard deviation of the mean is more than 1 we say it's a color image
+        # where mean = average (arithmetic mean) pixel level for each band in the image.
+        # note we ignore alpha bands here
+        return stdv(stat.mean[:3]) > 1
+
+
+@contextlib.contextmanager
+def _open_image(filepath):
+    """Open the image at filepath with PIL, counting its size as read."""
+    from PIL import Image
+
+    try:
+        record_read(get_stat(filepath).st_size)
+    except OSError:
+        pass
+    contents = open_path(filepath)
+    try:
+        with Image.open(contents) as image:
+            yield image
+    finally:
+        if not isinstance(contents, (str, bytes)):
+            contents.close()
 
 
 def stdv(band_means):
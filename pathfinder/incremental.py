@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""pathfinder - find the paths changed since the previous scan."""
+import os
+import time
+
+from pathfinder import filters, walk_and_filter
+from pathfinder.state import load_state, save_state
+
+# filesystems stamp times from a coarse clock (FAT to the nearest two seconds),
+# so the high-water mark is moved back to not miss paths changed as a scan starts
+_CLOCK_SLACK = 2.0
+
+
+def find_changed_paths(
+    directory_path,
+    state_path,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    prune=None,
+):
+    """
+    Find the paths changed since the scan recorded in state_path.
+
+    The first scan finds every path accepted by filter. Each scan saves the
+    time it started to state_path as a high-water mark, and the next scan
+    only finds the paths modified or changed since then. A path changed
+    while a scan runs may be found by the next scan as well.
+
+    directory_path must be a directory.
+
+    With prune, the scan only finds new or replaced entries. The directory
+    mtimes are saved too, and the files of a directory whose mtime has not
+    moved are not stat-ed at all. A directory's mtime changes when entries
+    are added, removed or renamed in it, but not when a file in it is
+    written to, so files modified in place, by an append or a rewrite, are
+    missed. Every directory is still listed.
+
+    Bytes paths are recorded in the state decoded with os.fsdecode.
+    """
+    state = load_state(state_path)
+    started = time.time() - _CLOCK_SLACK
+
+    path_filter = filter or filters.AlwaysAcceptFilter()
+    if state.get("mark") is not None:
+        path_filter = filters.ChangedSinceFilter(state["mark"]) & path_filter
+
+    base_path = os.path.normpath(directory_path)
+    recorder = _DirectoryRecorder(state.get("dirs") if prune else None)
+    recorder.record(base_path)
+    if ignore:
+        # the recorder goes first so it sees every directory
+        ignore = recorder | ignore
+    else:
+        ignore = recorder
+
+    paths = walk_and_filter(directory_path, path_filter, ignore, abspath, depth)
+
+    new_state = {"mark": started}
+    if prune:
+        new_state["dirs"] = recorder.mtimes
+    save_state(state_path, new_state)
+    return paths
+
+
+class _DirectoryRecorder(filters.Filter):
+    """
+    Record the mtime of each directory walked.
+
+    Used as an ignore filter it never ignores a directory, and ignores the
+    files of the directories whose mtime matches previous_mtimes.
+    """
+
+    def __init__(self, previous_mtimes=None):
+        """Initialise the recorder with the mtimes from the previous scan."""
+        self.previous_mtimes = previous_mtimes
+        self.mtimes = {}
+
+    def record(self, dirpath):
+        """Record the mtime of dirpath."""
+        try:
+            # keyed by str, to be saved as JSON
+            self.mtimes[os.fsdecode(dirpath)] = filters.get_stat(dirpath).st_mtime_ns
+        except OSError:
+            pass
+
+    def accepts(self, filepath):
+        """Return True for the files in an unchanged directory."""
+        if filters.is_dir(filepath):
+            self.record(filepath)
+            return False
+        if not self.previous_mtimes:
+            return False
+        parent = os.fsdecode(os.path.dirname(filepath)) or os.curdir
+        mtime = self.mtimes.get(parent)
+        return mtime is not None and self.previous_mtimes.get(parent) == mtime
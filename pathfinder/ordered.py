@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - walk in sorted order, in bounded memory.
+
+sorted_walk_and_filter yields the paths in string order as they are found,
+so a manifest of millions of paths can be written without holding them:
+
+    with open("MANIFEST", "w") as manifest:
+        for path in sorted_walk_and_filter("/srv/data", filters.FileFilter()):
+            print(path, file=manifest)
+
+Each directory's entries are sorted as it is listed, and a directory is
+descended into where its name followed by a separator falls, so a depth
+first walk visits the paths in order. A walk with worker threads finds the
+paths out of order, so they are sorted with external_sort instead, which
+spills sorted runs to temporary files and merges them.
+"""
+import heapq
+import os
+import tempfile
+
+from pathfinder import _get_base_path, _get_device, _walk_sorted, filters
+
+# the records of a spilled run are separated by NUL, which no path contains
+_END = b"\0"
+_READ_SIZE = 65536
+
+
+def sorted_walk_and_filter(
+    filepath,
+    pathfilter,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    one_filesystem=None,
+    source=None,
+    max_workers=None,
+    run_size=100000,
+    tempdir=None,
+):
+    """
+    Walk the file tree and yield the paths accepted, in sorted order.
+
+    The paths are those walk_and_filter_generator finds, but joined and
+    normalised the same way for directories as for files, and in string
+    order. Only the listings of the directories on the way down to the
+    current one are held.
+
+    To walk with parallel_walk_and_filter pass the number of threads as
+    max_workers. Its paths are then sorted with external_sort, in runs of
+    run_size paths spilled to temporary files in tempdir.
+    """
+    if not os.path.exists(filepath):
+        raise EnvironmentError(filepath)
+    depth = -1 if depth is None else int(depth)
+    base_path = _get_base_path(filepath)
+
+    if max_workers:
+        return _parallel_sorted(
+            filepath,
+            pathfilter,
+            ignore,
+            abspath,
+            depth,
+            one_filesystem,
+            source,
+            max_workers,
+            run_size,
+            tempdir,
+        )
+    paths = _walk_sorted(
+        base_path,
+        pathfilter,
+        ignore,
+        depth,
+        _get_device(base_path) if one_filesystem else None,
+        source,
+    )
+    if abspath:
+        return (os.path.abspath(path) for path, _ in paths)
+    return (path for path, _ in paths)
+
+
+def external_sort(paths, run_size=100000, tempdir=None):
+    """
+    Yield paths, str or bytes, in sorted order.
+
+    At most run_size paths are held at once. The paths are sorted in runs
+    of run_size, each written to a temporary file in tempdir, and the runs
+    are merged, reading each a block at a time.
+    """
+    runs = []
+    run = []
+    try:
+        for path in paths:
+            run.append(path)
+            if len(run) >= run_size:
+                runs.append(_spill(run, tempdir))
+                run = []
+        run.sort()
+        if not runs:
+            yield from run
+            return
+        decode = runs[0][1]
+        yield from heapq.merge(
+            *(_read_run(spilled, decode) for spilled, _ in runs), run
+        )
+    finally:
+        for spilled, _ in runs:
+            spilled.close()
+
+
+def _parallel_sorted(
+    filepath,
+    pathfilter,
+    ignore,
+    abspath,
+    depth,
+    one_filesystem,
+    source,
+    max_workers,
+    run_size,
+    tempdir,
+):
+    """Yield the paths a parallel walk accepts, sorted with external_sort."""
+    from pathfinder.parallel import parallel_walk_and_filter
+
+    # absolute paths are joined the same way for directories and files, and
+    # sort the same as the paths relative to the top
+    paths = parallel_walk_and_filter(
+        filepath,
+        pathfilter,
+        ignore,
+        True,
+        None if depth == -1 else depth,
+        one_filesystem,
+        max_workers=max_workers,
+        source=source,
+    )
+    if abspath:
+        yield from external_sort(paths, run_size, tempdir)
+        return
+    base_path = _get_base_path(filepath)
+    top = os.path.abspath(base_path)
+    start = len(os.path.join(top, top[:0]))
+    prefix = filters.child_paths(base_path, [base_path[:0]])[0]
+    for path in external_sort(paths, run_size, tempdir):
+        yield prefix + path[start:]
+
+
+def _spill(run, tempdir):
+    """Write run, sorted, to a temporary file and return (file, is str)."""
+    run.sort()
+    decode = isinstance(run[0], str)
+    spilled = tempfile.TemporaryFile(dir=tempdir)
+    for start in range(0, len(run), 1024):
+        spilled.write(
+            b"".join(
+                (os.fsencode(path) if decode else path) + _END
+                for path in run[start : start + 1024]
+            )
+        )
+    spilled.seek(0)
+    return spilled, decode
+
+
+def _read_run(spilled, decode):
+    """Yield the paths of a spilled run, a block at a time."""
+    rest = b""
+    while True:
+        block = spilled.read(_READ_SIZE)
+        if not block:
+            return
+        records = (rest + block).split(_END)
+        rest = records.pop()
+        if decode:
+            yield from (os.fsdecode(record) for record in records)
+        else:
+            yield from records
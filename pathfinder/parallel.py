@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - walk with a pool of threads, scheduled per device.
+
+Directories are listed and filtered by worker threads. Each device, by
+st_dev, has its own queue of directories and its own limit on how many of
+them are worked on at once, so a slow network mount only ties up its own
+share of the workers while the other devices keep theirs busy:
+
+    paths = parallel_walk_and_filter(
+        "/", filters.FnmatchFilter("*.log"),
+        device_limits={"/mnt/nfs": 2}, default_limit=8,
+    )
+"""
+import functools
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pathfinder import (
+    _get_base_path,
+    _get_depth,
+    _get_device,
+    _is_descended,
+    _list_dir,
+    _process_tree,
+    sources,
+)
+
+
+def parallel_walk_and_filter(
+    filepath,
+    pathfilter,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    one_filesystem=None,
+    device_limits=None,
+    default_limit=4,
+    max_workers=None,
+    source=None,
+):
+    """
+    Walk the file tree with worker threads and yield the paths accepted.
+
+    The paths are the same as walk_and_filter_generator finds, but in the
+    order the directories are done. device_limits maps a device, by st_dev
+    or by a path on it such as its mount point, to the number of its
+    directories worked on at once, default_limit for the devices not in it.
+    max_workers caps the threads shared by all the devices, by default the
+    sum of the limits of the devices given and default_limit.
+
+    Filters are called from the worker threads, so must be thread safe.
+    """
+    if not os.path.exists(filepath):
+        raise EnvironmentError(filepath)
+    depth = -1 if depth is None else int(depth)
+    if abspath is None:
+        abspath = False
+
+    base_path = _get_base_path(filepath)
+    scheduler = DeviceScheduler(device_limits, default_limit)
+    top_device = _get_device(base_path)
+    if max_workers is None:
+        max_workers = sum(scheduler.limits.values()) + default_limit
+    work = functools.partial(
+        _work,
+        source or sources.FileSystemSource(),
+        pathfilter,
+        ignore,
+        abspath,
+        base_path,
+        depth,
+        top_device if one_filesystem else None,
+    )
+    scheduler.add(base_path, top_device)
+    return _parallel_walk(work, scheduler, max_workers)
+
+
+def _parallel_walk(work, scheduler, max_workers):
+    """Yield the paths work accepts from the directories queued in scheduler."""
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while scheduler or running:
+                for root, device in scheduler.ready(max_workers - len(running)):
+                    running[executor.submit(work, root)] = device
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _finish(future, scheduler, running)
+        finally:
+            for future in running:
+                future.cancel()
+
+
+def _finish(future, scheduler, running):
+    """Queue the subdirectories of a done directory and return its paths."""
+    scheduler.finished(running.pop(future))
+    accepted, subdirs = future.result()
+    for subdir, device in subdirs:
+        scheduler.add(subdir, device)
+    return accepted
+
+
+def _work(source, pathfilter, ignore, abspath, base_path, depth, device, root):
+    """
+    List and filter root, returning the paths and the subdirectories.
+
+    device is the device a one_filesystem walk stays on, or None.
+    """
+    listed = _list_dir(source, root)
+    if listed is None:
+        return [], []
+    dirs, files, entries = listed
+    accepted = list(
+        _process_tree(
+            dirs, ignore, root, pathfilter, abspath, base_path, files, entries
+        )
+    )
+    if depth != -1 and _get_depth(root, base_path) + 1 >= depth:
+        return accepted, []
+    return accepted, _subdirs(root, dirs, entries, device)
+
+
+def _subdirs(root, dirs, entries, device):
+    """Return the (path, device) pairs of the directories of root to walk."""
+    subdirs = []
+    for adir in dirs:
+        entry = entries[adir]
+        if not _is_descended(entry, device):
+            continue
+        try:
+            subdirs.append((os.path.join(root, adir), _get_device(entry)))
+        except OSError:
+            continue
+    return subdirs
+
+
+class DeviceScheduler:
+    """
+    Queues of directories per device, each with a limit on how many run.
+
+    limits maps a device, by st_dev or by a path on it, to its limit, and
+    default_limit applies to the other devices.
+    """
+
+    def __init__(self, limits=None, default_limit=4):
+        """Initialise the scheduler with no directories queued."""
+        self.limits = {}
+        for device, limit in (limits or {}).items():
+            if not isinstance(device, int):
+                device = _get_device(device)
+            self.limits[device] = limit
+        self.default_limit = default_limit
+        self.running = {}
+        self._queues = {}
+        # the devices are taken in turn, so each gets a fair share
+        self._order = deque()
+
+    def __bool__(self):
+        """Return whether any directories are queued."""
+        return any(self._queues.values())
+
+    def add(self, dirpath, device):
+        """Queue dirpath, on device."""
+        if device not in self._queues:
+            self._queues[device] = deque()
+            self.running[device] = 0
+            self._order.append(device)
+        self._queues[device].append(dirpath)
+
+    def limit(self, device):
+        """Return how many directories on device may run at once."""
+        return max(1, self.limits.get(device, self.default_limit))
+
+    def ready(self, slots):
+        """Return up to slots (dirpath, device) pairs that may start now."""
+        started = []
+        progressed = True
+        while slots > 0 and progressed:
+            progressed = False
+            for _ in range(len(self._order)):
+                device = self._order[0]
+                self._order.rotate(-1)
+                queue = self._queues[device]
+                if queue and self.running[device] < self.limit(device) and slots:
+                    # depth first within a device, to keep the queues short
+                    started.append((queue.pop(), device))
+                    self.running[device] += 1
+                    slots -= 1
+                    progressed = True
+        return started
+
+    def finished(self, device):
+        """Record that a directory on device is done."""
+        self.running[device] -= 1
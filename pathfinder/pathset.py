@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""pathfinder - a memory efficient set of paths."""
+import os
+import sys
+from collections.abc import MutableSet
+
+_BYTES_SEP = os.fsencode(os.sep)
+
+
+class _Node:
+    """A directory trie node."""
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        """Initialise an empty node."""
+        # created on demand, most nodes are files without children
+        self.children = None
+        self.terminal = False
+
+
+class PathSet(MutableSet):
+    """
+    A set of paths stored as a trie of path segments.
+
+    Each directory segment is stored once however many paths share it, and
+    the segment strings are interned. Iteration yields the paths grouped by
+    directory. The usual set operations and comparisons are supported.
+
+    The paths may be str or bytes, but not both in one set.
+    """
+
+    def __init__(self, paths=()):
+        """Initialise the set with the paths."""
+        self._root = _Node()
+        self._len = 0
+        for path in paths:
+            self.add(path)
+
+    def __contains__(self, path):
+        """Return whether path is in the set."""
+        if not isinstance(path, (str, bytes)):
+            return False
+        node = self._find(path)
+        return node is not None and node.terminal
+
+    def __iter__(self):
+        """Iterate over the paths, grouped by directory."""
+        stack = [(None, self._root)]
+        while stack:
+            path, node = stack.pop()
+            if node.terminal:
+                yield path
+            if node.children:
+                stack.extend(
+                    (_join(path, name), child)
+                    for name, child in reversed(node.children.items())
+                )
+
+    def __len__(self):
+        """Return the number of paths in the set."""
+        return self._len
+
+    def __repr__(self):
+        """Return the representation of the set."""
+        return f"{self.__class__.__name__}({list(self)!r})"
+
+    def add(self, path):
+        """Add path to the set."""
+        node = self._root
+        for name in path.split(_get_sep(path)):
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[_intern(name)] = _Node()
+            node = child
+        if not node.terminal:
+            node.terminal = True
+            self._len += 1
+
+    def discard(self, path):
+        """Remove path from the set if it is a member."""
+        if not isinstance(path, (str, bytes)):
+            return
+        nodes, node = [], self._root
+        for name in path.split(_get_sep(path)):
+            if not node.children or name not in node.children:
+                return
+            nodes.append((node, name))
+            node = node.children[name]
+        if not node.terminal:
+            return
+        node.terminal = False
+        self._len -= 1
+        # prune the nodes no longer leading to a path
+        for parent, name in reversed(nodes):
+            child = parent.children[name]
+            if child.terminal or child.children:
+                break
+            del parent.children[name]
+            if not parent.children:
+                parent.children = None
+
+    def iter_sorted(self):
+        """Iterate over the paths in sorted order."""
+        stack = [iter(self._sorted_items(None, self._root))]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+            elif item[2]:
+                stack.append(iter(self._sorted_items(item[1], item[3])))
+            else:
+                yield item[1]
+
+    @staticmethod
+    def _sorted_items(path, node):
+        """
+        Return the sorted (key, path, descend, node) items for node's children.
+
+        A child has an item for itself and one, keyed with a trailing
+        separator, for its children so they fall in string order.
+        """
+        items = []
+        for name, child in (node.children or {}).items():
+            child_path = _join(path, name)
+            if child.terminal:
+                items.append((name, child_path, False, child))
+            if child.children:
+                items.append((name + _get_sep(name), child_path, True, child))
+        items.sort(key=lambda item: item[0])
+        return items
+
+    def _find(self, path):
+        """Return the node for path, or None."""
+        node = self._root
+        for name in path.split(_get_sep(path)):
+            if not node.children:
+                return None
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+
+def _join(path, name):
+    """Join name to path, the path of its parent node."""
+    return name if path is None else path + _get_sep(name) + name
+
+
+def _get_sep(path):
+    """Return the path separator, as bytes if path is bytes."""
+    return _BYTES_SEP if isinstance(path, bytes) else os.sep
+
+
+def _intern(name):
+    """Return name, interned if it is a str."""
+    return sys.intern(name) if isinstance(name, str) else name
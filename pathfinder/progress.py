@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - report the progress of a walk.
+
+Pass a Progress to a walk to be told, every interval seconds, how far it
+has got:
+
+    progress = Progress(log_progress(logging.getLogger("scan")), interval=5)
+    paths = find_paths("/srv", fnmatch="*.log", progress=progress)
+
+The counts are kept per directory, not per entry, and the callback is only
+called once the interval has passed, so reporting costs next to nothing.
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import namedtuple
+
+ProgressEvent = namedtuple(
+    "ProgressEvent",
+    "directories entries matches bytes_read depth frontier elapsed rate done",
+)
+ProgressEvent.__doc__ = """
+A snapshot of the progress of a walk.
+
+rate is the number of entries seen per second since the previous event.
+"""
+
+# the Progress of the walk a filter is running in
+_PROGRESS = contextvars.ContextVar("pathfinder_progress", default=None)
+
+
+class Progress:
+    """
+    Count the progress of a walk, calling callback with a ProgressEvent.
+
+    The callback is called at most every interval seconds while walking, and
+    once more when the walk is done.
+    """
+
+    def __init__(self, callback=None, interval=1.0):
+        """Initialise the progress of a walk that has not started."""
+        self.callback = callback
+        self.interval = interval
+        self.directories = 0
+        self.entries = 0
+        self.matches = 0
+        self.bytes_read = 0
+        self.depth = 0
+        self.frontier = 0
+        self.events = 0
+        self._lock = threading.Lock()
+        self._started = self._reported = time.monotonic()
+        self._reported_entries = 0
+        self._next = self._started + interval
+
+    def directory(self, depth, entries, matches, frontier):
+        """Count a directory listed, reporting if the interval has passed."""
+        self.directories += 1
+        self.entries += entries
+        self.matches += matches
+        self.depth = depth
+        self.frontier = frontier
+        now = time.monotonic()
+        if now >= self._next:
+            self._report(now, False)
+
+    def read(self, nbytes):
+        """Count nbytes of file contents read by a filter."""
+        with self._lock:
+            self.bytes_read += nbytes
+
+    def finish(self):
+        """Report that the walk is done."""
+        self._report(time.monotonic(), True)
+
+    def event(self, now=None, done=False):
+        """Return a ProgressEvent for the progress so far."""
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._reported
+        rate = (self.entries - self._reported_entries) / elapsed if elapsed else 0.0
+        return ProgressEvent(
+            self.directories,
+            self.entries,
+            self.matches,
+            self.bytes_read,
+            self.depth,
+            self.frontier,
+            now - self._started,
+            rate,
+            done,
+        )
+
+    def _report(self, now, done):
+        """Call the callback with the progress so far."""
+        event = self.event(now, done)
+        self._reported = now
+        self._reported_entries = self.entries
+        self._next = now + self.interval
+        self.events += 1
+        if self.callback is not None:
+            self.callback(event)
+
+
+def log_progress(logger=None, level=logging.INFO):
+    """Return a callback logging each ProgressEvent to logger."""
+    logger = logger or logging.getLogger("pathfinder")
+
+    def callback(event):
+        """Log event."""
+        logger.log(
+            level,
+            "%s: %d directories, %d entries, %d matches, %d bytes read, "
+            "depth %d, %d directories to go, %.0f entries/s",
+            "done" if event.done else "walking",
+            event.directories,
+            event.entries,
+            event.matches,
+            event.bytes_read,
+            event.depth,
+            event.frontier,
+            event.rate,
+        )
+
+    return callback
+
+
+def reporting(progress):
+    """Return a context in which filters count the bytes they read to progress."""
+    if progress is None:
+        return contextlib.nullcontext()
+    return _reporting(progress)
+
+
+@contextlib.contextmanager
+def _reporting(progress):
+    """Make progress the Progress filters count the bytes they read to."""
+    token = _PROGRESS.set(progress)
+    try:
+        yield
+    finally:
+        _PROGRESS.reset(token)
+
+
+def current_progress():
+    """Return the Progress of the walk, or None."""
+    return _PROGRESS.get()
+
+
+def record_read(nbytes, progress=None):
+    """Count nbytes read by a filter to progress, or the walk's Progress."""
+    progress = progress or _PROGRESS.get()
+    if progress is not None:
+        progress.read(nbytes)
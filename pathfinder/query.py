@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - find paths with a query string.
+
+A query is made of predicates combined with and, or, not and parentheses,
+predicates next to each other are combined with and:
+
+    name:*.log and size>10M and not path:~/tmp/
+
+The predicates are:
+
+    name:GLOB       the name of the path matches GLOB
+    ext:EXT         the name ends with .EXT, in any case, such as ext:tar.gz
+    path:PATH       the path is PATH or under it, or matches PATH if a glob
+    regex:REGEX     the path matches the regular expression REGEX
+    type:TYPE       the path is a file or a dir
+    content:TYPE    the content type sniffed from the file matches TYPE
+    size>SIZE       the file size compares with SIZE, such as 10M, using
+                    one of >, >=, <, <= or =
+    mtime>TIME      the modification time is after or before TIME, either a
+                    date such as 2024-01-31 or an age such as 7d, meaning
+                    that long ago; ctime and atime work the same way
+
+Values containing spaces or parentheses can be quoted. The planner orders
+the predicates of each and and or so the cheap ones, such as names, run
+before the ones needing a stat or reading the file, and turns a top level
+"not path:PATH" into a hint for the walker to not descend into PATH.
+"""
+import os
+import re
+import time
+from datetime import datetime
+
+from pathfinder import filters, walk_and_filter
+
+# estimated cost of a predicate on one path, relative to matching a name,
+# and the estimated fraction of paths it accepts
+PREDICATE_COSTS = {
+    "name": (1.0, 0.1),
+    "ext": (1.0, 0.1),
+    "path": (1.0, 0.5),
+    "regex": (2.0, 0.1),
+    "type": (2.0, 0.5),
+    "size": (5.0, 0.3),
+    "mtime": (5.0, 0.3),
+    "ctime": (5.0, 0.3),
+    "atime": (5.0, 0.3),
+    "content": (50.0, 0.1),
+}
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+_TOKEN = re.compile(r'\s*(\(|\)|(?:[^\s()"]|"[^"]*")+)')
+_PREDICATE = re.compile(r"(\w+)(:|>=|<=|>|<|=)(.*)$", re.DOTALL)
+_COMPARISONS = (">=", "<=", ">", "<", "=")
+
+
+class QuerySyntaxError(ValueError):
+    """The query string cannot be parsed."""
+
+
+class Query:
+    """
+    A parsed and planned query.
+
+    filter is the Filter for the query and ignore a Filter of the paths the
+    walker need not descend into, or None.
+    """
+
+    def __init__(self, text):
+        """Parse and plan the query text."""
+        self.text = text
+        self.plan = _Parser(text).parse().planned()
+        self.prune = self.plan.prune_hints()
+        self.filter = self.plan.build()
+        self.ignore = None
+        if self.prune:
+            self.ignore = filters.OrFilter(*(_path_filter(path) for path in self.prune))
+
+    def __repr__(self):
+        """Return the representation of the query."""
+        return f"{self.__class__.__name__}({self.text!r})"
+
+    def explain(self):
+        """Return a description of the plan, with the estimated cost of each node."""
+        lines = self.plan.explain()
+        lines.extend(f"prune {path}" for path in self.prune)
+        return "\n".join(lines)
+
+    def find(self, directory_path, ignore=None, abspath=None, depth=None, source=None):
+        """Return the paths in directory_path matching the query."""
+        if self.ignore is not None:
+            ignore = self.ignore if ignore is None else self.ignore | ignore
+        return walk_and_filter(
+            directory_path, self.filter, ignore, abspath, depth, source=source
+        )
+
+
+def find_query(
+    directory_path, query, ignore=None, abspath=None, depth=None, source=None
+):
+    """Return the paths in directory_path matching the query string."""
+    return Query(query).find(directory_path, ignore, abspath, depth, source)
+
+
+class _Predicate:
+    """A predicate of the query."""
+
+    def __init__(self, field, operator, value):
+        """Initialise the predicate, checking it can be built."""
+        if field not in PREDICATE_COSTS:
+            raise QuerySyntaxError(f"unknown field {field!r}")
+        if not value:
+            raise QuerySyntaxError(f"missing value for {field}")
+        self.field = field
+        self.operator = operator
+        self.value = value
+        self.cost, self.selectivity = PREDICATE_COSTS[field]
+        self.filter = self._build_filter()
+
+    def planned(self):
+        """Return the predicate."""
+        return self
+
+    def prune_hints(self):
+        """Return no paths, only a negated path predicate prunes the walk."""
+        return []
+
+    def build(self):
+        """Return the Filter for the predicate."""
+        return self.filter
+
+    def explain(self, indent=""):
+        """Return the lines describing the predicate."""
+        return [f"{indent}{self}  {_estimates(self)}"]
+
+    def __str__(self):
+        """Return the predicate as written in a query."""
+        value = self.value
+        if not value or re.search(r'[\s()"]', value):
+            value = f'"{value}"'
+        return f"{self.field}{self.operator}{value}"
+
+    def _build_filter(self):  # noqa:C901
+        """Return a new Filter for the predicate."""
+        field, value = self.field, self.value
+        if field in ("size", "mtime", "ctime", "atime"):
+            if self.operator not in _COMPARISONS:
+                raise QuerySyntaxError(f"{field} must be compared, as in {field}>1")
+            return self._build_comparison()
+        if self.operator != ":":
+            raise QuerySyntaxError(f"use {field}:{value}")
+        if field == "name":
+            return filters.NameFilter(value)
+        if field == "ext":
+            return filters.ExtensionFilter(value)
+        if field == "path":
+            return _path_filter(value)
+        if field == "regex":
+            try:
+                return filters.RegexFilter(value)
+            except re.error as error:
+                raise QuerySyntaxError(f"bad regex {value!r}: {error}") from error
+        if field == "type":
+            if value == "file":
+                return filters.FileFilter()
+            if value in ("dir", "directory"):
+                return filters.DirectoryFilter()
+            raise QuerySyntaxError(f"unknown type {value!r}, use file or dir")
+        return filters.ContentTypeFilter(value)
+
+    def _build_comparison(self):
+        """Return a new Filter comparing a size or time."""
+        if self.field == "size":
+            size = _parse_size(self.value)
+            low, high = {
+                ">": (size + 1, None),
+                ">=": (size, None),
+                "<": (None, size - 1),
+                "<=": (None, size),
+                "=": (size, size),
+            }[self.operator]
+            return filters.SizeFilter(max_bytes=high, min_bytes=low)
+        time_filter = {
+            "mtime": filters.ModifiedTimeFilter,
+            "ctime": filters.ChangedTimeFilter,
+            "atime": filters.AccessedTimeFilter,
+        }[self.field]
+        moment = _parse_time(self.value)
+        if self.operator in (">", ">="):
+            return time_filter(after=moment)
+        if self.operator in ("<", "<="):
+            return time_filter(before=moment)
+        raise QuerySyntaxError(f"{self.field} can only be compared with > or <")
+
+
+class _Not:
+    """A negated node."""
+
+    def __init__(self, child):
+        """Initialise the node."""
+        self.child = child
+        self.cost = child.cost
+        self.selectivity = 1.0 - child.selectivity
+
+    def planned(self):
+        """Return the node with its child planned."""
+        return _Not(self.child.planned())
+
+    def prune_hints(self):
+        """Return the path of a negated path prefix predicate."""
+        child = self.child
+        if (
+            isinstance(child, _Predicate)
+            and child.field == "path"
+            and not _is_glob(child.value)
+        ):
+            return [_expand(child.value)]
+        return []
+
+    def build(self):
+        """Return the Filter for the node."""
+        return filters.NotFilter(self.child.build())
+
+    def explain(self, indent=""):
+        """Return the lines describing the node."""
+        return [f"{indent}not  {_estimates(self)}"] + self.child.explain(indent + "  ")
+
+
+class _Boolean:
+    """An and or an or of several nodes."""
+
+    def __init__(self, operator, children):
+        """Initialise the node, flattening children with the same operator."""
+        self.operator = operator
+        self.children = []
+        for child in children:
+            if isinstance(child, _Boolean) and child.operator == operator:
+                self.children.extend(child.children)
+            else:
+                self.children.append(child)
+        self.cost, self.selectivity = self._estimate()
+
+    def planned(self):
+        """
+        Return the node with its children in the cheapest order.
+
+        The children of an and are ordered by cost per path rejected, those
+        of an or by cost per path accepted, as each only evaluates a child
+        for the paths the children before it did not decide.
+        """
+        children = [child.planned() for child in self.children]
+        if self.operator == "and":
+            children.sort(key=lambda child: _per(child.cost, 1.0 - child.selectivity))
+        else:
+            children.sort(key=lambda child: _per(child.cost, child.selectivity))
+        return _Boolean(self.operator, children)
+
+    def prune_hints(self):
+        """Return the paths pruned by all of the children of an and."""
+        if self.operator != "and":
+            return []
+        return [path for child in self.children for path in child.prune_hints()]
+
+    def build(self):
+        """Return the Filter for the node."""
+        children = [child.build() for child in self.children]
+        if self.operator == "and":
+            return filters.AndFilter(*children)
+        return filters.OrFilter(*children)
+
+    def explain(self, indent=""):
+        """Return the lines describing the node."""
+        lines = [f"{indent}{self.operator}  {_estimates(self)}"]
+        for child in self.children:
+            lines.extend(child.explain(indent + "  "))
+        return lines
+
+    def _estimate(self):
+        """Return the estimated (cost, selectivity), evaluating in order."""
+        cost, undecided = 0.0, 1.0
+        for child in self.children:
+            cost += undecided * child.cost
+            if self.operator == "and":
+                undecided *= child.selectivity
+            else:
+                undecided *= 1.0 - child.selectivity
+        if self.operator == "and":
+            return cost, undecided
+        return cost, 1.0 - undecided
+
+
+class _Parser:
+    """A recursive descent parser for query strings."""
+
+    def __init__(self, text):
+        """Split text into tokens."""
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if match is None:
+                raise QuerySyntaxError(f"unbalanced quote at {position}")
+            self.tokens.append(match.group(1))
+            position = match.end()
+        self.position = 0
+
+    def parse(self):
+        """Return the node for the whole query."""
+        if not self.tokens:
+            raise QuerySyntaxError("empty query")
+        node = self._or()
+        if self.position < len(self.tokens):
+            raise QuerySyntaxError(f"unexpected {self.tokens[self.position]!r}")
+        return node
+
+    def _peek(self):
+        """Return the next token, lower cased if a keyword, or None."""
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        return token.lower() if token.lower() in ("and", "or", "not") else token
+
+    def _next(self):
+        """Return the next token and move past it."""
+        token = self._peek()
+        if token is None:
+            raise QuerySyntaxError("unexpected end of query")
+        self.position += 1
+        return token
+
+    def _or(self):
+        """Parse an or of ands."""
+        children = [self._and()]
+        while self._peek() == "or":
+            self._next()
+            children.append(self._and())
+        return children[0] if len(children) == 1 else _Boolean("or", children)
+
+    def _and(self):
+        """Parse an and of nots, and is implied between them."""
+        children = [self._not()]
+        while self._peek() not in (None, "or", ")"):
+            if self._peek() == "and":
+                self._next()
+            children.append(self._not())
+        return children[0] if len(children) == 1 else _Boolean("and", children)
+
+    def _not(self):
+        """Parse a negated or a plain atom."""
+        if self._peek() == "not":
+            self._next()
+            return _Not(self._not())
+        return self._atom()
+
+    def _atom(self):
+        """Parse a parenthesised query or a predicate."""
+        token = self._next()
+        if token == "(":
+            node = self._or()
+            if self._next() != ")":
+                raise QuerySyntaxError("expected ')'")
+            return node
+        if token in ("and", "or", ")"):
+            raise QuerySyntaxError(f"unexpected {token!r}")
+        match = _PREDICATE.match(token)
+        if match is None:
+            raise QuerySyntaxError(
+                f"expected a predicate such as name:*.txt, not {token!r}"
+            )
+        field, operator, value = match.groups()
+        return _Predicate(field.lower(), operator, value.replace('"', ""))
+
+
+def _path_filter(path):
+    """Return a Filter for the paths matching path, or at or under it."""
+    path = _expand(path)
+    if _is_glob(path):
+        return filters.FnmatchFilter(path)
+    return filters.RegexFilter(re.escape(path) + f"({re.escape(os.sep)}|$)")
+
+
+def _expand(path):
+    """Return path with a leading ~ expanded and without a trailing separator."""
+    path = os.path.expanduser(path)
+    return path.rstrip(os.sep) or path
+
+
+def _is_glob(value):
+    """Return whether value has glob wildcards."""
+    return any(char in value for char in "*?[")
+
+
+def _parse_size(value):
+    """Return the number of bytes in a size such as 10M."""
+    match = re.match(r"(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?$", value, re.IGNORECASE)
+    if match is None:
+        raise QuerySyntaxError(f"bad size {value!r}, use a size such as 10M")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def _parse_time(value):
+    """Return the seconds since the epoch for a date, or an age such as 7d."""
+    match = re.match(r"(\d+(?:\.\d+)?)([smhdw])$", value)
+    if match is not None:
+        number, unit = match.groups()
+        return time.time() - float(number) * AGE_UNITS[unit]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError as error:
+        raise QuerySyntaxError(
+            f"bad time {value!r}, use a date such as 2024-01-31 or an age such as 7d"
+        ) from error
+
+
+def _per(cost, fraction):
+    """Return cost divided by fraction, infinite if fraction is 0."""
+    return cost / fraction if fraction > 0 else float("inf")
+
+
+def _estimates(node):
+    """Return the estimated cost and selectivity of node, for explain."""
+    return f"(cost {node.cost:.2f}, selectivity {node.selectivity:.2f})"
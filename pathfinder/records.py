@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - export the paths of a walk and their stat as records.
+
+The records are a NumPy structured array, with a row of RECORD_FIELDS for
+each path, filled from the stat results the walker already has. Paths are
+stored once in a PathTable, each as a name and the id of its parent
+directory, so a row refers to its path by id. Needs NumPy.
+"""
+import csv
+import os
+import struct
+import sys
+
+from pathfinder import _get_base_path, filters, walk_and_filter_generator
+
+RECORD_FIELDS = (
+    ("path_id", "<i8"),
+    ("parent_id", "<i8"),
+    ("size", "<i8"),
+    ("mtime_ns", "<i8"),
+    ("mode", "<u4"),
+    ("inode", "<u8"),
+)
+
+
+def find_records(
+    directory_path,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    chunk_size=65536,
+    csv_path=None,
+    npy_path=None,
+    source=None,
+):
+    """
+    Find the paths accepted by filter, all paths by default, as records.
+
+    Return (records, table): the records array and the PathTable of the ids
+    in it. The array starts with room for chunk_size rows and doubles when
+    full. Every chunk_size rows the new rows are also appended to csv_path,
+    with the path as a column, and to npy_path if given, so both files are
+    written as the walk goes rather than at the end.
+    """
+    if not os.path.exists(directory_path):
+        raise EnvironmentError(directory_path)
+    base_path = _get_base_path(directory_path)
+    if abspath:
+        base_path = os.path.abspath(base_path)
+    writer = _RecordWriter(chunk_size, csv_path, npy_path)
+    collector = _RecordCollector(
+        filter or filters.AlwaysAcceptFilter(), PathTable(base_path), writer, abspath
+    )
+    try:
+        # the collector keeps the records rather than accepting the paths
+        for _ in walk_and_filter_generator(
+            directory_path, collector, ignore, abspath, depth, source
+        ):
+            pass
+        writer.flush(collector.table)
+    finally:
+        writer.close()
+    return writer.records(), collector.table
+
+
+class PathTable:
+    """
+    Paths stored as the id of their parent directory and their name.
+
+    Ids are given out in order from 0, the root. str names are interned, and
+    only directories are indexed by path.
+    """
+
+    def __init__(self, root):
+        """Initialise the table with the root directory."""
+        self.parents = [-1]
+        self.names = [root]
+        self._dirs = {root: 0}
+
+    def __len__(self):
+        """Return the number of paths in the table."""
+        return len(self.names)
+
+    def add(self, path, is_dir=False):
+        """Add path, whose parent is in or under the root, and return its id."""
+        if is_dir and path in self._dirs:
+            return self._dirs[path]
+        dirpath, name = os.path.split(path)
+        # the parent may be added first, the children of "." have no dirname
+        parent = self.directory_id(dirpath) if dirpath else 0
+        ident = len(self.names)
+        self.parents.append(parent)
+        # bytes names cannot be interned
+        self.names.append(sys.intern(name) if isinstance(name, str) else name)
+        if is_dir:
+            self._dirs[path] = ident
+        return ident
+
+    def directory_id(self, dirpath):
+        """Return the id of the directory dirpath, adding it if needed."""
+        ident = self._dirs.get(dirpath)
+        if ident is None:
+            ident = self.add(dirpath, is_dir=True)
+        return ident
+
+    def path(self, ident):
+        """Return the path with id ident."""
+        names = []
+        while ident > 0:
+            names.append(self.names[ident])
+            ident = self.parents[ident]
+        if not names or self.names[0] not in (os.curdir, os.fsencode(os.curdir)):
+            names.append(self.names[0])
+        return os.path.join(*reversed(names))
+
+
+class _RecordCollector(filters.Filter):
+    """Record the paths pathfilter accepts, accepting nothing itself."""
+
+    def __init__(self, pathfilter, table, writer, abspath):
+        """Initialise the collector."""
+        self.pathfilter = pathfilter
+        self.table = table
+        self.writer = writer
+        self.abspath = abspath
+
+    @property
+    def batch(self):
+        """Return True if the wrapped filter is evaluated in batches."""
+        return filters.supports_batch(self.pathfilter)
+
+    def accepts(self, filepath):
+        """Record filepath if it is accepted."""
+        if self.pathfilter.accepts(filepath):
+            self._record(filepath)
+        return False
+
+    def accepts_many(self, dirpath, names):
+        """Record the accepted names."""
+        mask = self.pathfilter.accepts_many(dirpath, names)
+        for path, accepted in zip(filters.child_paths(dirpath, names), mask):
+            if accepted:
+                self._record(path)
+        return [False] * len(names)
+
+    def _record(self, filepath):
+        """Add a row for filepath."""
+        try:
+            stat = filters.get_stat(filepath)
+        except OSError:
+            return
+        is_dir = filters.is_dir(filepath)
+        if self.abspath:
+            filepath = os.path.abspath(filepath)
+        ident = self.table.add(filepath, is_dir)
+        self.writer.append(
+            (
+                ident,
+                self.table.parents[ident],
+                stat.st_size,
+                stat.st_mtime_ns,
+                stat.st_mode,
+                stat.st_ino,
+            ),
+            self.table,
+        )
+
+
+class _RecordWriter:
+    """A growable records array, written out in chunks."""
+
+    def __init__(self, chunk_size, csv_path, npy_path):
+        """Initialise an empty array with room for chunk_size rows."""
+        import numpy
+
+        self.dtype = numpy.dtype(list(RECORD_FIELDS))
+        self.chunk_size = max(1, chunk_size)
+        self.array = numpy.zeros(self.chunk_size, dtype=self.dtype)
+        self.count = 0
+        self.written = 0
+        self._csv_file = self._csv = self._npy = None
+        if csv_path is not None:
+            self._csv_file = open(csv_path, "w", newline="", encoding="utf-8")
+            self._csv = csv.writer(self._csv_file)
+            self._csv.writerow(["path"] + [name for name, _ in RECORD_FIELDS])
+        if npy_path is not None:
+            self._npy = _NpyWriter(npy_path, self.dtype)
+
+    def append(self, row, table):
+        """Add row, growing the array if it is full."""
+        if self.count == len(self.array):
+            self._grow()
+        self.array[self.count] = row
+        self.count += 1
+        if self.count - self.written >= self.chunk_size:
+            self.flush(table)
+
+    def flush(self, table):
+        """Write the rows not yet written."""
+        chunk = self.array[self.written : self.count]
+        if self._csv is not None:
+            for row in chunk.tolist():
+                path = os.fsdecode(table.path(row[0]))
+                self._csv.writerow([path] + list(row))
+        if self._npy is not None:
+            self._npy.write(chunk)
+        self.written = self.count
+
+    def records(self):
+        """Return the rows."""
+        return self.array[: self.count]
+
+    def close(self):
+        """Close the output files."""
+        if self._csv_file is not None:
+            self._csv_file.close()
+        if self._npy is not None:
+            self._npy.close()
+
+    def _grow(self):
+        """Double the room in the array."""
+        import numpy
+
+        array = numpy.zeros(2 * len(self.array), dtype=self.dtype)
+        array[: self.count] = self.array
+        self.array = array
+
+
+class _NpyWriter:
+    """Write a one dimensional .npy file a chunk of rows at a time."""
+
+    # room for the largest row count in the header
+    SHAPE_WIDTH = 20
+
+    def __init__(self, npy_path, dtype):
+        """Open npy_path and reserve the header."""
+        from numpy.lib import format as npy_format
+
+        self.count = 0
+        self._descr = npy_format.dtype_to_descr(dtype)
+        self._file = open(npy_path, "wb")
+        self._file.write(self._header())
+
+    def write(self, chunk):
+        """Append the rows of chunk."""
+        self._file.write(chunk.tobytes())
+        self.count += len(chunk)
+
+    def close(self):
+        """Write the final row count into the header and close the file."""
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+    def _header(self):
+        """Return the version 1.0 header for count rows."""
+        shape = str(self.count).rjust(self.SHAPE_WIDTH)
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%s,), }" % (
+            self._descr,
+            shape,
+        )
+        # the magic, version and length take 10 bytes, the whole header is
+        # padded with spaces to a multiple of 64 bytes and ends in a newline
+        padding = -(10 + len(header) + 1) % 64
+        header = (header + " " * padding + "\n").encode("latin1")
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""pathfinder - walks that can be stopped and resumed."""
+import os
+import time
+
+from pathfinder import _get_base_path, _is_not_accepted_depth, _process_tree, _walk
+from pathfinder.state import load_state, save_state
+
+
+def resumable_walk(  # noqa:C901
+    filepath,
+    pathfilter,
+    state_path,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    checkpoint_interval=5.0,
+    checkpoint_every=None,
+    shard=0,
+    shards=1,
+    source=None,
+):
+    """
+    Walk the file tree and filter it's contents, saving the walk's progress.
+
+    The frontier of directories still to be walked, and the number of paths
+    already yielded from the current directory, are saved to state_path every
+    checkpoint_interval seconds, and every checkpoint_every paths if given.
+    Starting the walk again with the same filepath, filters and state_path
+    continues from the last checkpoint. Closing the generator saves a final
+    checkpoint, but if the process dies the paths yielded after the last
+    checkpoint are yielded again, so pass 1 for checkpoint_every to never see
+    a path twice. Once the walk is complete the state records that, and
+    walking again yields nothing until the state file is removed.
+
+    Directories are walked in sorted order so a resumed walk lists them the
+    same way. To split a walk between parallel workers, give each worker its
+    own state_path and pass shards, the number of workers, and shard, the
+    number of this worker. Each worker walks an equal share of the top level
+    directories, and worker 0 also finds the paths directly in filepath.
+
+    Bytes paths are saved decoded with os.fsdecode, and encoded again when
+    the walk resumes.
+    """
+    depth = -1 if depth is None else int(depth)
+    if abspath is None:
+        abspath = False
+
+    base_path = _get_base_path(filepath)
+    walk_key = {
+        "root": os.fsdecode(base_path),
+        "depth": depth,
+        "shard": [shard, shards],
+    }
+    state = load_state(state_path)
+    if state and state.get("walk") != walk_key:
+        raise ValueError(f"{state_path} was saved for a different walk")
+    if state.get("done"):
+        return
+
+    checkpoint = _Checkpoint(
+        state_path, walk_key, state.get("emitted", 0), checkpoint_interval
+    )
+    if state:
+        stack = state["pending"] + [state["current"]]
+        if isinstance(base_path, bytes):
+            stack = [os.fsencode(path) for path in stack]
+        current, skip = stack[-1], state["skip"]
+    else:
+        stack, current, skip = [base_path], base_path, 0
+
+    for root, dirs, files, entries in _walk(base_path, source, stack):
+        if _is_not_accepted_depth(root, base_path, depth):
+            break
+
+        # list each directory the same way every time
+        dirs.sort()
+        files.sort()
+        results = list(
+            _process_tree(
+                dirs, ignore, root, pathfilter, abspath, base_path, files, entries
+            )
+        )
+        if root == base_path:
+            # share the top level directories between the workers
+            dirs[:] = dirs[shard::shards]
+            if shard != 0:
+                results = []
+        if root != current:
+            skip = 0
+        checkpoint.maybe_save(stack, root, skip)
+
+        for index in range(skip, len(results)):
+            try:
+                yield results[index]
+            except GeneratorExit:
+                # the walk was stopped, after the caller was done with this path
+                checkpoint.emitted += 1
+                checkpoint.save(stack, root, index + 1)
+                raise
+            checkpoint.emitted += 1
+            if checkpoint_every and checkpoint.emitted % checkpoint_every == 0:
+                checkpoint.save(stack, root, index + 1)
+            else:
+                checkpoint.maybe_save(stack, root, index + 1)
+
+    checkpoint.finish()
+
+
+class _Checkpoint:
+    """Save the progress of a resumable walk."""
+
+    def __init__(self, state_path, walk_key, emitted, interval):
+        """Initialise the checkpoint for the walk identified by walk_key."""
+        self.state_path = state_path
+        self.walk_key = walk_key
+        self.emitted = emitted
+        self.interval = interval
+        self.saved_at = time.monotonic()
+
+    def maybe_save(self, stack, current, skip):
+        """Save the progress if the checkpoint interval has passed."""
+        if self.interval is not None and (
+            time.monotonic() - self.saved_at >= self.interval
+        ):
+            self.save(stack, current, skip)
+
+    def save(self, stack, current, skip):
+        """
+        Save the progress.
+
+        stack is the walk's frontier, not including current, the directory
+        whose first skip paths have been yielded.
+        """
+        save_state(
+            self.state_path,
+            {
+                "walk": self.walk_key,
+                "pending": [os.fsdecode(path) for path in stack],
+                "current": os.fsdecode(current),
+                "skip": skip,
+                "emitted": self.emitted,
+            },
+        )
+        self.saved_at = time.monotonic()
+
+    def finish(self):
+        """Record that the walk is complete."""
+        save_state(
+            self.state_path,
+            {"walk": self.walk_key, "emitted": self.emitted, "done": True},
+        )
+
+
+def remove_state(state_path):
+    """Remove the state of a resumable walk, so the next walk starts afresh."""
+    try:
+        os.remove(state_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - walk with a pool of processes.
+
+The tree is split into work units of directories. A worker process walks
+its unit until it has listed chunk_size directories, then hands the
+directories it has not reached back, and those are queued as new units for
+whichever worker is idle first. Big subtrees are shared out this way however
+unbalanced the tree is, and each worker runs the filters without contending
+for the GIL.
+
+The filters are sent to each worker once, so must be picklable. Filters that
+are not, such as ones built around a lambda, can be given as a query string
+instead, see pathfinder.query, which each worker builds its filter from.
+
+The source is sent to each worker too. An ArchiveSource or a ListingCache
+is copied empty, and each worker opens and caches its own archives and
+listings. A ThrottledSource cannot be pickled, since its budget cannot be
+shared between processes, and a walk with one raises TypeError.
+"""
+import os
+import pickle
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pathfinder import (
+    _get_base_path,
+    _get_depth,
+    _get_device,
+    _is_descended,
+    _list_dir,
+    _process_tree,
+    sources,
+)
+
+# the filters of the walk in a worker process
+_worker = {}
+
+
+def sharded_walk_and_filter(
+    filepath,
+    pathfilter,
+    ignore=None,
+    abspath=None,
+    depth=None,
+    one_filesystem=None,
+    processes=None,
+    chunk_size=64,
+    source=None,
+):
+    """
+    Walk the file tree with worker processes and yield the paths accepted.
+
+    pathfilter is a Filter, or a query string the workers parse. The paths
+    are the same as walk_and_filter_generator finds, but in the order the
+    work units are done. processes is the number of workers, one per CPU by
+    default, and chunk_size the number of directories a worker lists before
+    sharing out the rest of its unit.
+    """
+    if not os.path.exists(filepath):
+        raise EnvironmentError(filepath)
+    depth = -1 if depth is None else int(depth)
+    if abspath is None:
+        abspath = False
+
+    base_path = _get_base_path(filepath)
+    device = _get_device(base_path) if one_filesystem else None
+    processes = processes or os.cpu_count() or 1
+    walk = (pathfilter, ignore, abspath, depth, base_path, device, source)
+    try:
+        # the workers may be spawned rather than forked, so check up front
+        pickle.dumps(walk)
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        raise TypeError(
+            f"the filters and source of a sharded walk must be picklable: {error}"
+        ) from error
+
+    return _sharded_walk(walk, base_path, processes, chunk_size)
+
+
+def _sharded_walk(walk, base_path, processes, chunk_size):
+    """Yield the paths the worker processes accept, sharing out the units."""
+    pending = deque([[base_path]])
+    running = set()
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(walk,)
+    ) as executor:
+        try:
+            while pending or running:
+                # keep a unit queued behind each busy worker
+                while pending and len(running) < 2 * processes:
+                    running.add(executor.submit(_scan, pending.popleft(), chunk_size))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    accepted, unreached = future.result()
+                    pending.extend(_split(unreached, processes))
+                    yield from accepted
+        finally:
+            for future in running:
+                future.cancel()
+
+
+def _split(dirpaths, parts):
+    """Split dirpaths into up to parts units."""
+    if not dirpaths:
+        return []
+    size = -(-len(dirpaths) // parts)
+    return [dirpaths[start : start + size] for start in range(0, len(dirpaths), size)]
+
+
+def _init_worker(walk):
+    """Set up the walk in a worker process, building the filters from a query."""
+    pathfilter, ignore, abspath, depth, base_path, device, source = walk
+    if isinstance(pathfilter, str):
+        from pathfinder.query import Query
+
+        query = Query(pathfilter)
+        pathfilter = query.filter
+        if query.ignore is not None:
+            ignore = query.ignore if ignore is None else query.ignore | ignore
+    _worker.update(
+        pathfilter=pathfilter,
+        ignore=ignore,
+        abspath=abspath,
+        depth=depth,
+        base_path=base_path,
+        device=device,
+        source=source or sources.FileSystemSource(),
+    )
+
+
+def _scan(dirpaths, chunk_size):
+    """
+    Walk the trees under dirpaths, listing up to chunk_size directories.
+
+    Return the paths accepted and the directories not reached.
+    """
+    walk = _worker
+    base_path, depth = walk["base_path"], walk["depth"]
+    stack = list(reversed(dirpaths))
+    accepted = []
+    listed = 0
+    while stack and listed < chunk_size:
+        root = stack.pop()
+        listed += 1
+        listing = _list_dir(walk["source"], root)
+        if listing is None:
+            continue
+        dirs, files, entries = listing
+        accepted.extend(
+            _process_tree(
+                dirs,
+                walk["ignore"],
+                root,
+                walk["pathfilter"],
+                walk["abspath"],
+                base_path,
+                files,
+                entries,
+            )
+        )
+        if depth != -1 and _get_depth(root, base_path) + 1 >= depth:
+            continue
+        for adir in reversed(dirs):
+            if _is_descended(entries[adir], walk["device"]):
+                stack.append(os.path.join(root, adir))
+    return accepted, stack[::-1]
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - find near duplicate images.
+
+Each image is reduced to a perceptual hash, a few bits that change little
+when the image is resized, recompressed or slightly edited, and images
+whose hashes differ in at most max_distance bits are grouped together.
+Hashing needs Pillow and NumPy.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pathfinder import filters, walk_and_filter_generator
+
+HASH_METHODS = ("difference", "average")
+
+
+def find_similar_images(
+    directory_path,
+    max_distance=4,
+    hash_size=8,
+    method="difference",
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    processes=None,
+):
+    """
+    Find groups of similar images.
+
+    The images accepted by filter, ImageFilter by default, are hashed by
+    method, "difference" or "average", into hash_size * hash_size bits in
+    processes worker processes, one per CPU by default. Return a list of
+    groups, each a list of two or more paths in walk order, linking images
+    whose hashes are at most max_distance bits apart.
+    """
+    if not os.path.exists(directory_path):
+        raise EnvironmentError(directory_path)
+    if method not in HASH_METHODS:
+        raise ValueError(f"unknown hash method {method!r}")
+    paths = list(
+        walk_and_filter_generator(
+            directory_path, filter or filters.ImageFilter(), ignore, abspath, depth
+        )
+    )
+    jobs = [(path, hash_size, method) for path in paths]
+    if processes == 1 or len(jobs) < 2:
+        hashes = [_hash_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            hashes = list(executor.map(_hash_job, jobs, chunksize=64))
+
+    index = HammingIndex(hash_size * hash_size, max_distance)
+    groups = _Groups()
+    for path, image_hash in zip(paths, hashes):
+        if image_hash is None:
+            continue
+        ident = index.add(image_hash)
+        groups.add(ident, path)
+        for other in index.near(image_hash):
+            if other != ident:
+                groups.union(ident, other)
+    return groups.groups()
+
+
+def image_hash(filepath, hash_size=8, method="difference"):
+    """
+    Return the perceptual hash of the image at filepath as an integer.
+
+    The image is reduced to greyscale and downscaled. The difference hash
+    sets a bit for each pixel brighter than its right hand neighbour, the
+    average hash for each pixel brighter than the mean.
+    """
+    import numpy
+    from PIL import Image
+
+    width = hash_size + 1 if method == "difference" else hash_size
+    with Image.open(filepath) as image:
+        small = image.convert("L").resize((width, hash_size), Image.BILINEAR)
+        pixels = numpy.asarray(small, dtype=numpy.int16)
+    if method == "difference":
+        bits = pixels[:, 1:] < pixels[:, :-1]
+    else:
+        bits = pixels > pixels.mean()
+    return int.from_bytes(numpy.packbits(bits).tobytes(), "big")
+
+
+def _hash_job(job):
+    """Return the hash of an image, or None if it cannot be read."""
+    filepath, hash_size, method = job
+    try:
+        return image_hash(filepath, hash_size, method)
+    except (OSError, ValueError):
+        return None
+
+
+def hamming_distance(first, second):
+    """Return the number of bits that differ between two hashes."""
+    return bin(first ^ second).count("1")
+
+
+class HammingIndex:
+    """
+    Find the hashes within max_distance bits of a hash, without a full scan.
+
+    The hash bits are split into max_distance + 1 chunks. Two hashes at most
+    max_distance bits apart must agree on at least one whole chunk, so only
+    the hashes sharing a chunk with the query are compared. With a
+    max_distance of bits or more every hash is near, and all are returned.
+    """
+
+    def __init__(self, bits, max_distance):
+        """Initialise an empty index of hashes of bits bits."""
+        self.bits = bits
+        self.max_distance = max_distance
+        # bits cannot be split into more than bits chunks, but then every hash is near
+        count = max_distance + 1 if max_distance < bits else 0
+        # (shift, mask) of each chunk, the remainder spread over the first
+        self._chunks = []
+        start = 0
+        for number in range(count):
+            width = bits // count + (1 if number < bits % count else 0)
+            self._chunks.append((start, (1 << width) - 1))
+            start += width
+        self._buckets = [{} for _ in self._chunks]
+        self._hashes = []
+
+    def __len__(self):
+        """Return the number of hashes in the index."""
+        return len(self._hashes)
+
+    def add(self, value):
+        """Add the hash value, and return its id."""
+        ident = len(self._hashes)
+        self._hashes.append(value)
+        for bucket, key in zip(self._buckets, self._keys(value)):
+            bucket.setdefault(key, []).append(ident)
+        return ident
+
+    def near(self, value):
+        """Return the ids of the hashes at most max_distance bits from value."""
+        if not self._chunks:
+            return list(range(len(self._hashes)))
+        found = set()
+        for bucket, key in zip(self._buckets, self._keys(value)):
+            for ident in bucket.get(key, ()):
+                if ident not in found and (
+                    hamming_distance(value, self._hashes[ident]) <= self.max_distance
+                ):
+                    found.add(ident)
+        return sorted(found)
+
+    def _keys(self, value):
+        """Return the chunks of value."""
+        return [(value >> shift) & mask for shift, mask in self._chunks]
+
+
+class _Groups:
+    """Union find over hash ids, remembering the path of each."""
+
+    def __init__(self):
+        """Initialise with no groups."""
+        self.parents = {}
+        self.paths = {}
+
+    def add(self, ident, path):
+        """Add ident, in a group of its own."""
+        self.parents[ident] = ident
+        self.paths[ident] = path
+
+    def find(self, ident):
+        """Return the representative of ident's group."""
+        root = ident
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[ident] != root:
+            self.parents[ident], ident = root, self.parents[ident]
+        return root
+
+    def union(self, first, second):
+        """Merge the groups of first and second."""
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parents[max(first, second)] = min(first, second)
+
+    def groups(self):
+        """Return the groups of two or more paths, in walk order."""
+        groups = {}
+        for ident in sorted(self.paths):
+            groups.setdefault(self.find(ident), []).append(self.paths[ident])
+        return [paths for paths in groups.values() if len(paths) > 1]
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - compact snapshots of a file tree.
+
+A snapshot records the paths of a walk, relative to the directory walked,
+along with their size, mtime and inode. The paths are stored in byte order
+with the prefix each path shares with the one before it left out, and the
+stat fields are stored in fixed width columns. A snapshot is memory-mapped
+when opened, so neither reading nor diffing snapshots loads them into memory.
+"""
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from collections import namedtuple
+
+from pathfinder import _walk_sorted, filters
+
+MAGIC = b"PFSNAP01"
+
+# magic, number of entries, offset and size of the path data
+_HEADER = struct.Struct("<8sQQQ")
+
+# number of column values buffered before they are written out
+_CHUNK_SIZE = 65536
+
+SnapshotEntry = namedtuple("SnapshotEntry", "path size mtime_ns inode")
+
+
+def write_snapshot(
+    snapshot_path,
+    directory_path,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+):
+    """
+    Walk the tree rooted at directory_path and save a snapshot of it.
+
+    Only the paths accepted by filter are recorded, and the paths accepted by
+    ignore are not walked. Return the number of entries recorded.
+    """
+    if not os.path.isdir(directory_path):
+        raise EnvironmentError(directory_path)
+    path_filter = filter or filters.AlwaysAcceptFilter()
+
+    columns = [array("q"), array("q"), array("Q")]
+    column_files = [tempfile.TemporaryFile() for _ in columns]
+    paths_file = tempfile.TemporaryFile()
+    try:
+        count, previous = 0, b""
+        # the paths are stored in byte order, so sort the names by their bytes
+        paths = _walk_sorted(directory_path, path_filter, ignore, key=os.fsencode)
+        start = len(filters.child_paths(directory_path, [directory_path[:0]])[0])
+        for path, entry in paths:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            relpath = os.fsencode(path[start:])
+            paths_file.write(_encode_path(previous, relpath))
+            previous = relpath
+            columns[0].append(stat.st_size)
+            columns[1].append(stat.st_mtime_ns)
+            columns[2].append(stat.st_ino)
+            count += 1
+            if len(columns[0]) == _CHUNK_SIZE:
+                _flush_columns(columns, column_files)
+        _flush_columns(columns, column_files)
+
+        paths_offset = _HEADER.size + count * 24
+        with open(snapshot_path, "wb") as snapshot_file:
+            snapshot_file.write(
+                _HEADER.pack(MAGIC, count, paths_offset, paths_file.tell())
+            )
+            for column_file in column_files + [paths_file]:
+                column_file.seek(0)
+                shutil.copyfileobj(column_file, snapshot_file)
+    finally:
+        for column_file in column_files + [paths_file]:
+            column_file.close()
+    return count
+
+
+class Snapshot:
+    """A memory-mapped snapshot, iterated as SnapshotEntry tuples in path order."""
+
+    def __init__(self, snapshot_path):
+        """Open and memory-map the snapshot at snapshot_path."""
+        with open(snapshot_path, "rb") as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, paths_offset, paths_size = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{snapshot_path} is not a pathfinder snapshot")
+
+        self._count = count
+        self._paths = (paths_offset, paths_offset + paths_size)
+        view = memoryview(self._map)
+        start = _HEADER.size
+        self._views = [view]
+        for typecode in "qqQ":
+            self._views.append(view[start : start + count * 8].cast(typecode))
+            start += count * 8
+        self.sizes, self.mtimes, self.inodes = self._views[1:]
+
+    def __len__(self):
+        """Return the number of entries in the snapshot."""
+        return self._count
+
+    def __iter__(self):
+        """Iterate over the entries in path order."""
+        for index, relpath in enumerate(self._iter_paths()):
+            yield self._entry(index, relpath)
+
+    def __enter__(self):
+        """Return the snapshot."""
+        return self
+
+    def __exit__(self, *_):
+        """Close the snapshot."""
+        self.close()
+
+    def close(self):
+        """Release the memory map."""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+
+    def stat_fields(self, index):
+        """Return the (size, mtime_ns, inode) of the entry at index."""
+        return self.sizes[index], self.mtimes[index], self.inodes[index]
+
+    def _entry(self, index, relpath):
+        """Return the SnapshotEntry at index, whose path is relpath."""
+        return SnapshotEntry(os.fsdecode(relpath), *self.stat_fields(index))
+
+    def _iter_paths(self):
+        """Decode the relative paths, as bytes, in order."""
+        data = self._map
+        position, end = self._paths
+        previous = b""
+        while position < end:
+            shared, position = _decode_varint(data, position)
+            length, position = _decode_varint(data, position)
+            previous = previous[:shared] + data[position : position + length]
+            position += length
+            yield previous
+
+
+def diff_snapshots(old, new):
+    """
+    Compare two snapshots, yielding (status, path) for each difference.
+
+    status is "added", "removed" or "changed", where a changed path has a
+    different size, mtime or inode. old and new are Snapshot objects or the
+    paths of snapshot files. Both snapshots are streamed side by side.
+    """
+    old_snapshot = old if isinstance(old, Snapshot) else Snapshot(old)
+    new_snapshot = new if isinstance(new, Snapshot) else Snapshot(new)
+    try:
+        yield from _merge(old_snapshot, new_snapshot)
+    finally:
+        if old_snapshot is not old:
+            old_snapshot.close()
+        if new_snapshot is not new:
+            new_snapshot.close()
+
+
+def _merge(old, new):
+    """Merge the path streams of the old and new snapshots."""
+    old_paths, new_paths = enumerate(old._iter_paths()), enumerate(new._iter_paths())
+    old_index, old_path = next(old_paths, (None, None))
+    new_index, new_path = next(new_paths, (None, None))
+    while old_path is not None or new_path is not None:
+        if new_path is None or (old_path is not None and old_path < new_path):
+            yield "removed", os.fsdecode(old_path)
+            old_index, old_path = next(old_paths, (None, None))
+        elif old_path is None or new_path < old_path:
+            yield "added", os.fsdecode(new_path)
+            new_index, new_path = next(new_paths, (None, None))
+        else:
+            if old.stat_fields(old_index) != new.stat_fields(new_index):
+                yield "changed", os.fsdecode(new_path)
+            old_index, old_path = next(old_paths, (None, None))
+            new_index, new_path = next(new_paths, (None, None))
+
+
+def _flush_columns(columns, column_files):
+    """Write out and empty the buffered column values."""
+    for column, column_file in zip(columns, column_files):
+        column.tofile(column_file)
+        del column[:]
+
+
+def _encode_path(previous, relpath):
+    """Return relpath encoded against the path before it."""
+    shared = len(os.path.commonprefix([previous, relpath]))
+    suffix = relpath[shared:]
+    return _encode_varint(shared) + _encode_varint(len(suffix)) + suffix
+
+
+def _encode_varint(value):
+    """Return value encoded as an unsigned LEB128 varint."""
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _decode_varint(data, position):
+    """Return the varint at position in data and the position after it."""
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
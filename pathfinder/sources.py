@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - sources of directory listings for the walker.
+
+A source lists a directory for the walker. Its scandir(dirpath) method
+returns a list of entries that behave like os.DirEntry: they have a name,
+is_dir(), is_file(), is_symlink() and stat() methods. Entries may also have
+an open() method returning a binary file object, which filters reading the
+contents use instead of opening the path, see filters.open_path.
+"""
+import collections
+import io
+import logging
+import os
+import stat as stat_module
+import tarfile
+import threading
+import time
+import zipfile
+
+_logger = logging.getLogger("pathfinder")
+
+
+class FileSystemSource:
+    """List directories from the file system."""
+
+    def scandir(self, dirpath):
+        """Return the os.DirEntry objects of dirpath."""
+        with os.scandir(dirpath) as scanner:
+            return list(scanner)
+
+
+class ArchiveSource:
+    """
+    List zip and tar archives as if they were directories.
+
+    Archives are listed from their member tables, the zip central directory
+    or the tar headers, without extracting anything. Member entries report
+    the member size and mtime, and the contents of a member are only read,
+    into memory, when a filter such as the image filters opens it.
+
+    The max_archives archives listed most recently are kept open, by path,
+    to read their members, until close is called. An archive dropped from
+    them is read again if the walk comes back to it, so one source may be
+    shared by the threads of a parallel walk. An archive that cannot be read
+    is logged, and listing it raises OSError, which the walk handles as for
+    any directory it cannot list. A pickled source, such as the copy each
+    worker of a sharded walk has, opens its archives afresh.
+
+    Bytes paths are supported, the members are then listed with bytes names.
+    """
+
+    ZIP_SUFFIXES = (".zip",)
+    TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+    def __init__(self, source=None, max_archives=8):
+        """Initialise the archive source over source, the file system by default."""
+        self.source = source or FileSystemSource()
+        self.max_archives = max_archives
+        # the archives listed most recently, shared by the walk's threads
+        self._archives = collections.OrderedDict()
+        self._lock = threading.Lock()
+        suffixes = self.ZIP_SUFFIXES + self.TAR_SUFFIXES
+        self._suffixes = {
+            str: (suffixes, self.ZIP_SUFFIXES),
+            bytes: (
+                tuple(os.fsencode(suffix) for suffix in suffixes),
+                tuple(os.fsencode(suffix) for suffix in self.ZIP_SUFFIXES),
+            ),
+        }
+
+    def __getstate__(self):
+        """Return the state to pickle, without the open archives."""
+        state = self.__dict__.copy()
+        del state["_archives"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state, with no archives open."""
+        self.__dict__.update(state)
+        self._archives = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def scandir(self, dirpath):
+        """Return the entries of dirpath, which may be in an archive."""
+        archive = self._find_archive(dirpath)
+        if archive is not None:
+            return archive.listing(dirpath)
+        return [
+            _ArchiveEntry(entry) if self._is_archive_entry(entry) else entry
+            for entry in self.source.scandir(dirpath)
+        ]
+
+    def close(self):
+        """Close the archives being walked."""
+        with self._lock:
+            archives = list(self._archives.values())
+            self._archives.clear()
+        for archive in archives:
+            archive.close()
+
+    def is_archive(self, filepath):
+        """Return whether filepath has an archive extension."""
+        return filepath.lower().endswith(self._suffixes[type(filepath)][0])
+
+    def _is_zip(self, filepath):
+        """Return whether filepath has a zip extension."""
+        return filepath.lower().endswith(self._suffixes[type(filepath)][1])
+
+    def _find_archive(self, dirpath):
+        """Return the _Archive that dirpath is, or is in, or None."""
+        path = dirpath
+        while path:
+            if self.is_archive(path):
+                archive = self._get_archive(path)
+                if archive is not None:
+                    return archive
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return None
+
+    def _get_archive(self, path):
+        """Return the _Archive at path, reading it if need be, or None."""
+        with self._lock:
+            archive = self._archives.get(path)
+            if archive is not None:
+                self._archives.move_to_end(path)
+                return archive
+            if not os.path.isfile(path):
+                return None
+            archive = self._archives[path] = _Archive(path, self._is_zip(path))
+            while len(self._archives) > max(1, self.max_archives):
+                self._archives.popitem(last=False)[1].close()
+        return archive
+
+    def _is_archive_entry(self, entry):
+        """Return whether entry is an archive file."""
+        if not self.is_archive(entry.name):
+            return False
+        try:
+            return entry.is_file()
+        except OSError:
+            return False
+
+
+class _ArchiveEntry:
+    """An archive file, listed as a directory."""
+
+    def __init__(self, entry):
+        """Wrap the os.DirEntry of the archive."""
+        self._entry = entry
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        """Return True, the walker descends into archives."""
+        return True
+
+    def is_file(self, follow_symlinks=True):
+        """Return False, the archive is listed as a directory."""
+        return False
+
+    def is_symlink(self):
+        """Return whether the archive file is a symbolic link."""
+        return self._entry.is_symlink()
+
+    def stat(self, follow_symlinks=True):
+        """Return the stat of the archive file."""
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class _MemberEntry:
+    """A member of an archive."""
+
+    def __init__(self, archive, member, parts, is_dir, size, mtime):
+        """Initialise the entry for member, whose path in archive is parts."""
+        self._archive = archive
+        self._member = member
+        self._is_dir = is_dir
+        self._size = size
+        self._mtime = mtime
+        self.name = parts[-1]
+        self.path = os.path.join(archive.path, *parts)
+
+    def is_dir(self, follow_symlinks=True):
+        """Return whether the member is a directory."""
+        return self._is_dir
+
+    def is_file(self, follow_symlinks=True):
+        """Return whether the member is a file."""
+        return not self._is_dir
+
+    def is_symlink(self):
+        """Return False, link members are not listed."""
+        return False
+
+    def stat(self, follow_symlinks=True):
+        """
+        Return an os.stat_result with the member's mode, size and mtime.
+
+        Members are on the device of the archive, for one_filesystem walks.
+        """
+        if self._is_dir:
+            mode = stat_module.S_IFDIR | 0o755
+        else:
+            mode = stat_module.S_IFREG | 0o644
+        mtime = int(self._mtime)
+        return os.stat_result(
+            (mode, 0, self._archive.device, 1, 0, 0, self._size, mtime, mtime, mtime),
+            {
+                "st_atime": self._mtime,
+                "st_mtime": self._mtime,
+                "st_ctime": self._mtime,
+                "st_mtime_ns": int(self._mtime * 1e9),
+            },
+        )
+
+    def open(self):
+        """Read the member into memory and return it as a binary file object."""
+        return io.BytesIO(self._archive.read(self._member))
+
+
+class _Archive:
+    """The member table of an archive, arranged as a tree of directories."""
+
+    def __init__(self, path, is_zip):
+        """
+        Read the member table of the archive at path.
+
+        Raise OSError if the archive cannot be read.
+        """
+        self.path = path
+        self.is_zip = is_zip
+        self.device = 0
+        self._dirs = {(): {}}
+        self._file = None
+        self._closed = False
+        self._sep = os.fsencode(os.sep) if isinstance(path, bytes) else os.sep
+        # filters may read members from several threads
+        self._lock = threading.Lock()
+        try:
+            self.device = os.stat(path).st_dev
+            members = self._zip_members() if is_zip else self._tar_members()
+            for member, name, is_dir, size, mtime in members:
+                self._add(member, name, is_dir, size, mtime)
+        except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError) as error:
+            self.close()
+            _logger.warning("cannot read the archive %s: %s", path, error)
+            raise OSError(f"cannot read the archive {path}: {error}") from error
+
+    def contains(self, dirpath):
+        """Return whether dirpath is the archive or a directory in it."""
+        if not isinstance(dirpath, type(self.path)):
+            return False
+        return dirpath == self.path or dirpath.startswith(self.path + self._sep)
+
+    def listing(self, dirpath):
+        """Return the member entries of dirpath."""
+        parts = ()
+        if dirpath != self.path:
+            parts = tuple(dirpath[len(self.path) + 1 :].split(self._sep))
+        return list(self._dirs.get(parts, {}).values())
+
+    def read(self, member):
+        """Return the contents of member, from the open archive."""
+        with self._lock:
+            archive = self._open()
+            try:
+                if self.is_zip:
+                    return archive.read(member)
+                member_file = archive.extractfile(member)
+                return member_file.read() if member_file else b""
+            finally:
+                if self._closed:
+                    self._close_file()
+
+    def close(self):
+        """Close the archive file, it is only opened again to read a member."""
+        with self._lock:
+            self._closed = True
+            self._close_file()
+
+    def _close_file(self):
+        """Close the ZipFile or TarFile if it is open."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        """Return the open ZipFile or TarFile, opening it if need be."""
+        if self._file is None:
+            # zipfile takes bytes for file contents, not paths
+            path = os.fsdecode(self.path)
+            if self.is_zip:
+                self._file = zipfile.ZipFile(path)
+            else:
+                self._file = tarfile.open(path, "r:*")
+        return self._file
+
+    def _zip_members(self):
+        """Yield (info, name, is_dir, size, mtime) from the zip central directory."""
+        for info in self._open().infolist():
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            yield info, info.filename, info.is_dir(), info.file_size, mtime
+
+    def _tar_members(self):
+        """Yield (info, name, is_dir, size, mtime) from the tar headers."""
+        for info in self._open().getmembers():
+            if info.isdir() or info.isfile():
+                yield info, info.name, info.isdir(), info.size, info.mtime
+
+    def _add(self, member, name, is_dir, size, mtime):
+        """Add member, a ZipInfo or TarInfo named name, and the directories above."""
+        parts = [part for part in name.split("/") if part not in ("", ".")]
+        if not parts or ".." in parts:
+            return
+        if isinstance(self.path, bytes):
+            parts = [os.fsencode(part) for part in parts]
+        # directories may only be implied by the paths of their members
+        for depth in range(1, len(parts)):
+            dir_parts = parts[:depth]
+            siblings = self._dirs[tuple(dir_parts[:-1])]
+            if dir_parts[-1] not in siblings:
+                siblings[dir_parts[-1]] = _MemberEntry(
+                    self, None, dir_parts, True, 0, mtime
+                )
+            self._dirs.setdefault(tuple(dir_parts), {})
+        self._dirs[tuple(parts[:-1])][parts[-1]] = _MemberEntry(
+            self, member, parts, is_dir, size, mtime
+        )
+        if is_dir:
+            self._dirs.setdefault(tuple(parts), {})
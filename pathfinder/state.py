@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""pathfinder - state saved between walks."""
+import json
+import os
+
+
+def load_state(state_path):
+    """Return the state saved at state_path, or an empty state."""
+    try:
+        with open(state_path) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state_path, state):
+    """Save the state to state_path, replacing the previous state in one step."""
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, state_path)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+pathfinder - throttle the I/O of a walk.
+
+An IOBudget limits the rate of directory listings, stats and bytes read with
+token buckets, and adapts how many of those calls may run at once to keep
+their latency under a target. A ThrottledSource makes the walker, and the
+filters through it, spend from a budget:
+
+    budget = IOBudget(stats_per_second=2000, target_latency=0.005)
+    paths = find_paths("/srv", filter=SizeFilter(min_bytes=1 << 30),
+                       source=ThrottledSource(budget))
+"""
+import contextlib
+import io
+import threading
+import time
+
+from pathfinder.sources import FileSystemSource
+
+
+class TokenBucket:
+    """Allow rate units per second, in bursts of up to capacity units."""
+
+    def __init__(self, rate, capacity=None):
+        """Initialise a full bucket."""
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Take amount units from the bucket, waiting until they are available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # go into debt for amounts larger than the bucket, later callers
+            # wait for it to be paid off
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class IOBudget:
+    """
+    Limit the rate and concurrency of listings, stats and reads.
+
+    listings_per_second, stats_per_second and bytes_per_second cap each kind
+    of call, None leaves it unlimited. With target_latency, in seconds, the
+    number of calls allowed at once is adapted between 1 and max_concurrency:
+    it is halved while the average latency of the calls is over the target
+    and grows by one while it is under. Once only one call is allowed, each
+    call is delayed instead, until the latency recovers.
+    """
+
+    # weight of the latest latency in the moving average
+    SMOOTHING = 0.2
+    # the longest a call is delayed while the latency is over the target
+    MAX_DELAY = 1.0
+
+    def __init__(
+        self,
+        listings_per_second=None,
+        stats_per_second=None,
+        bytes_per_second=None,
+        target_latency=None,
+        max_concurrency=8,
+    ):
+        """Initialise the budget."""
+        self.buckets = {
+            kind: TokenBucket(rate)
+            for kind, rate in (
+                ("listing", listings_per_second),
+                ("stat", stats_per_second),
+                ("read", bytes_per_second),
+            )
+            if rate
+        }
+        self.target_latency = target_latency
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.latency = None
+        self.delay = 0.0
+        self.calls = 0
+        self._running = 0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def call(self, kind, amount=1):
+        """Wait for the budget to allow a call of kind, then time the call."""
+        bucket = self.buckets.get(kind)
+        if bucket is not None:
+            bucket.acquire(amount)
+        with self._condition:
+            while self._running >= self.concurrency:
+                self._condition.wait()
+            self._running += 1
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._observe(time.monotonic() - started)
+
+    def charge(self, kind, amount):
+        """Take amount from the rate of kind, waiting if it is over the rate."""
+        bucket = self.buckets.get(kind)
+        if bucket is not None:
+            bucket.acquire(amount)
+
+    def _observe(self, latency):
+        """Record the latency of a call, and adapt the concurrency to it."""
+        with self._condition:
+            self._running -= 1
+            self.calls += 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.SMOOTHING * (latency - self.latency)
+            if self.target_latency is not None:
+                self._adapt()
+            self._condition.notify_all()
+
+    def _adapt(self):
+        """Back off while the latency is over the target, speed up while under."""
+        if self.latency > self.target_latency:
+            if self.concurrency > 1:
+                self.concurrency = max(1, self.concurrency // 2)
+            else:
+                self.delay = min(self.MAX_DELAY, self.delay * 2 or self.target_latency)
+        elif self.delay:
+            self.delay = self.delay / 2 if self.delay > self.target_latency else 0.0
+        elif self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+
+
+class ThrottledSource:
+    """List directories, stat and read files within an IOBudget."""
+
+    def __init__(self, budget, source=None):
+        """Initialise the source over source, the file system by default."""
+        self.budget = budget
+        self.source = source or FileSystemSource()
+
+    def scandir(self, dirpath):
+        """Return the entries of dirpath, once the budget allows a listing."""
+        with self.budget.call("listing"):
+            entries = self.source.scandir(dirpath)
+        return [_ThrottledEntry(entry, self.budget) for entry in entries]
+
+
+class _ThrottledEntry:
+    """An entry whose stat and reads are charged to a budget."""
+
+    def __init__(self, entry, budget):
+        """Wrap entry."""
+        self._entry = entry
+        self._budget = budget
+        self._stat = {}
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        """Return whether the entry is a directory."""
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        """Return whether the entry is a file."""
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        """Return whether the entry is a symbolic link."""
+        return self._entry.is_symlink()
+
+    def stat(self, follow_symlinks=True):
+        """Return the stat of the entry, charging the budget the first time."""
+        if follow_symlinks not in self._stat:
+            with self._budget.call("stat"):
+                self._stat[follow_symlinks] = self._entry.stat(
+                    follow_symlinks=follow_symlinks
+                )
+        return self._stat[follow_symlinks]
+
+    def open(self):
+        """Return a binary file object whose reads are charged to the budget."""
+        if hasattr(self._entry, "open"):
+            raw = self._entry.open()
+        else:
+            raw = open(self._entry.path, "rb", buffering=0)
+        # unbuffered, so a read asks for no more than the caller wants
+        return _ThrottledReader(raw, self._budget)
+
+
+class _ThrottledReader(io.RawIOBase):
+    """An unbuffered binary reader charging the bytes read to a budget."""
+
+    def __init__(self, raw, budget):
+        """Wrap the binary file object raw."""
+        super(_ThrottledReader, self).__init__()
+        self._raw = raw
+        self._budget = budget
+
+    def readable(self):
+        """Return True."""
+        return True
+
+    def seekable(self):
+        """Return whether the wrapped file is seekable."""
+        return self._raw.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Seek the wrapped file."""
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        """Return the position in the wrapped file."""
+        return self._raw.tell()
+
+    def readinto(self, buffer):
+        """Read into buffer, charging the budget for the bytes read."""
+        # the bytes are charged once read, so a read waits for the reads
+        # before it to be paid for
+        with self._budget.call("read", 0):
+            data = self._raw.read(len(buffer))
+        self._budget.charge("read", len(data))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        """Close the wrapped file."""
+        self._raw.close()
+        super(_ThrottledReader, self).close()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""pathfinder - find the top paths by size, time or any key."""
+import heapq
+import itertools
+import os
+
+from pathfinder import filters, walk_and_filter_generator
+
+
+def top_paths(
+    directory_path,
+    k,
+    key,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    smallest=None,
+    source=None,
+):
+    """
+    Find the k paths with the largest key, largest first.
+
+    key is called with each path accepted by filter and its stat, which is
+    the stat the walker already has. Only the best k paths are kept while
+    walking. To find the k paths with the smallest key, smallest first, pass
+    True for smallest.
+    """
+    if not os.path.exists(directory_path):
+        raise EnvironmentError(directory_path)
+    collector = _TopCollector(
+        filter or filters.AlwaysAcceptFilter(), k, key, bool(smallest)
+    )
+    # the collector keeps the paths rather than accepting them
+    for _ in walk_and_filter_generator(
+        directory_path, collector, ignore, abspath, depth, source
+    ):
+        pass
+    paths = collector.paths()
+    if abspath:
+        paths = [os.path.abspath(path) for path in paths]
+    return paths
+
+
+def largest_paths(
+    directory_path,
+    k,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    source=None,
+):
+    """Find the k largest files, or paths accepted by filter, largest first."""
+    return top_paths(
+        directory_path,
+        k,
+        _size,
+        filter or filters.FileFilter(),
+        ignore,
+        abspath,
+        depth,
+        source=source,
+    )
+
+
+def newest_paths(
+    directory_path,
+    k,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    source=None,
+):
+    """Find the k most recently modified files, newest first."""
+    return top_paths(
+        directory_path,
+        k,
+        _mtime,
+        filter or filters.FileFilter(),
+        ignore,
+        abspath,
+        depth,
+        source=source,
+    )
+
+
+def oldest_paths(
+    directory_path,
+    k,
+    filter=None,  # skipcq: PYL-W0622
+    ignore=None,
+    abspath=None,
+    depth=None,
+    source=None,
+):
+    """Find the k least recently modified files, oldest first."""
+    return top_paths(
+        directory_path,
+        k,
+        _mtime,
+        filter or filters.FileFilter(),
+        ignore,
+        abspath,
+        depth,
+        smallest=True,
+        source=source,
+    )
+
+
+def _size(_, stat):
+    """Return the size from stat."""
+    return stat.st_size
+
+
+def _mtime(_, stat):
+    """Return the modification time from stat."""
+    return stat.st_mtime_ns
+
+
+class _Smaller:
+    """Order a key in reverse, so the heap keeps the smallest keys."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        """Wrap key."""
+        self.key = key
+
+    def __lt__(self, other):
+        """Return True if the key is larger than the other key."""
+        return other.key < self.key
+
+    def __eq__(self, other):
+        """Return True if the keys are equal."""
+        return self.key == other.key
+
+
+class _TopCollector(filters.Filter):
+    """
+    Keep the k paths with the largest keys of those pathfilter accepts.
+
+    The collector never accepts a path itself, so nothing is yielded by the
+    walk, and memory is bounded by k.
+    """
+
+    def __init__(self, pathfilter, k, key, smallest):
+        """Initialise an empty collector."""
+        self.pathfilter = pathfilter
+        self.k = k
+        self.key = key
+        self.smallest = smallest
+        # a min heap of (key, order, path), the worst kept path on top
+        self.heap = []
+        self._order = itertools.count()
+
+    @property
+    def batch(self):
+        """Return True if the wrapped filter is evaluated in batches."""
+        return filters.supports_batch(self.pathfilter)
+
+    def accepts(self, filepath):
+        """Keep filepath if it is accepted and is one of the top k so far."""
+        if self.pathfilter.accepts(filepath):
+            self._offer(filepath)
+        return False
+
+    def accepts_many(self, dirpath, names):
+        """Keep the accepted names that are in the top k so far."""
+        mask = self.pathfilter.accepts_many(dirpath, names)
+        for path, accepted in zip(filters.child_paths(dirpath, names), mask):
+            if accepted:
+                self._offer(path)
+        return [False] * len(names)
+
+    def paths(self):
+        """Return the paths kept, best first."""
+        return [path for _, _, path in sorted(self.heap, reverse=True)]
+
+    def _offer(self, filepath):
+        """Keep filepath if its key is in the top k."""
+        if self.k <= 0:
+            return
+        try:
+            key = self.key(filepath, filters.get_stat(filepath))
+        except OSError:
+            return
+        if self.smallest:
+            key = _Smaller(key)
+        # break ties by walk order, so keys are never compared with paths
+        item = (key, -next(self._order), filepath)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif self.heap[0] < item:
+            heapq.heapreplace(self.heap, item)
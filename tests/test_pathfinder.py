@@ -1,28 +1,85 @@
 """pathfinder tests module."""
 
+import json
+import logging
 import os
+import pickle
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from pathfinder import find_paths, walk_and_filter
+import pathfinder
+from pathfinder import (
+    find_paths,
+    incremental,
+    throttle,
+    walk_and_filter,
+    walk_and_filter_many,
+    walk_and_filter_many_generator,
+)
+from pathfinder.cache import ListingCache
+from pathfinder.estimate import estimate_paths
 from pathfinder.filters import (
+    EXTENSION_GROUPS,
+    SNIFF_SIZE,
+    AccessedTimeFilter,
+    AlwaysAcceptFilter,
     AndFilter,
+    ChangedSinceFilter,
     ColorImageFilter,
+    ContentTypeFilter,
     DirectoryFilter,
     DotDirectoryFilter,
+    ExtensionFilter,
     FileFilter,
+    Filter,
     FnmatchFilter,
     GreyscaleImageFilter,
     ImageDimensionFilter,
     ImageFilter,
+    ModifiedTimeFilter,
+    NameFilter,
     NotFilter,
     OrFilter,
     RegexFilter,
     SizeFilter,
+    content_type,
+    is_file,
+    open_path,
+    supports_batch,
 )
+from pathfinder.incremental import find_changed_paths
+from pathfinder.ordered import external_sort, sorted_walk_and_filter
+from pathfinder.parallel import DeviceScheduler, parallel_walk_and_filter
+from pathfinder.pathset import PathSet
+from pathfinder.progress import Progress, log_progress
+from pathfinder.query import Query, QuerySyntaxError, find_query
+from pathfinder.records import find_records
+from pathfinder.resume import remove_state, resumable_walk
+from pathfinder.sharded import sharded_walk_and_filter
+from pathfinder.similar import HammingIndex, find_similar_images, hamming_distance
+from pathfinder.snapshot import Snapshot, diff_snapshots, write_snapshot
+from pathfinder.sources import ArchiveSource, FileSystemSource
+from pathfinder.throttle import IOBudget, ThrottledSource, TokenBucket
+from pathfinder.topk import largest_paths, newest_paths, oldest_paths, top_paths
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import PIL
+except ImportError:
+    PIL = None
 
 BASEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 
+requires_numpy = pytest.mark.skipif(numpy is None, reason="needs numpy")
+requires_pil = pytest.mark.skipif(PIL is None, reason="needs Pillow")
+
 
 def test_just_dirs():
     """Test just_dirs parameter."""
@@ -339,6 +396,95 @@ def test_image():
     assert 6 == len(paths)
 
 
+def test_extension(tmp_path):
+    """Find paths by their extensions, in any case."""
+    assert 7 == len(walk_and_filter(BASEPATH, ExtensionFilter("txt", ".log")))
+    assert 0 == len(walk_and_filter(BASEPATH, ExtensionFilter()))
+    for name in ("A.JPG", "b.Png", "c.tif", "d.tar.gz", "e.TGZ", ".gz", "f.gz.txt"):
+        (tmp_path / name).write_bytes(b"")
+    tree = str(tmp_path)
+    assert ["A.JPG", "b.Png", "c.tif"] == sorted(
+        os.path.basename(path) for path in walk_and_filter(tree, ImageFilter())
+    )
+    archives = ExtensionFilter(groups="archives")
+    assert ["d.tar.gz", "e.TGZ"] == sorted(
+        os.path.basename(path) for path in walk_and_filter(tree, archives)
+    )
+    assert ExtensionFilter("tar.gz").accepts("d.tar.gz")
+    assert not ExtensionFilter("tar.gz").accepts("d.gz")
+    assert ExtensionFilter("txt").accepts(b"dir/F.TXT")
+    assert ExtensionFilter("txt", groups=("logs",)).accepts_many(
+        "dir", ["a.log.gz", "b.txt", "c.dat"]
+    ) == [True, True, False]
+    assert set(EXTENSION_GROUPS) >= {"images", "video", "archives", "logs"}
+    with pytest.raises(ValueError):
+        ExtensionFilter(groups="nonsense")
+
+
+def test_image_filter_evaluates_file_filter_once():
+    """Only evaluate the file filter of an image filter once per path."""
+
+    class CountingFilter(ExtensionFilter):
+        """Count the paths the filter is asked about."""
+
+        def accepts(self, filepath):
+            """Count the path."""
+            calls.append(filepath)
+            return super(CountingFilter, self).accepts(filepath)
+
+        def accepts_many(self, dirpath, names):
+            """Count the names."""
+            calls.extend(names)
+            return super(CountingFilter, self).accepts_many(dirpath, names)
+
+    calls = []
+    image_filter = ImageDimensionFilter()
+    image_filter.file_filter = CountingFilter(groups="images")
+    paths = find_paths(BASEPATH, filter=image_filter)
+    assert len(paths) == len(find_paths(BASEPATH, filter=ImageFilter()))
+    assert len(calls) == len(set(calls))
+
+
+def test_content_type(tmp_path):
+    """Find files by the content type sniffed from their first bytes."""
+    paths = walk_and_filter(BASEPATH, ContentTypeFilter("image/*"))
+    assert 6 == len(paths)
+    paths = walk_and_filter(BASEPATH, ContentTypeFilter("image/gif", "image/jpeg"))
+    assert 3 == len(paths)
+    assert "image/png" == content_type(os.path.join(BASEPATH, "python_logo.png"))
+    assert content_type(os.path.join(BASEPATH, "file1.txt")) is None
+
+    # the names do not matter
+    with open(os.path.join(BASEPATH, "python_logo.png"), "rb") as image:
+        (tmp_path / "LOGO").write_bytes(image.read())
+    (tmp_path / "fake.png").write_bytes(b"not an image")
+    tree = str(tmp_path)
+    assert [str(tmp_path / "LOGO")] == walk_and_filter(
+        tree, ContentTypeFilter("image/*")
+    )
+    assert [str(tmp_path / "LOGO")] == walk_and_filter(tree, ImageFilter(sniff=True))
+
+    # one file at a time, or a directory's files in parallel
+    single = ContentTypeFilter("image/*", workers=1)
+    parallel = ContentTypeFilter("image/*", min_parallel=2)
+    names = sorted(os.listdir(BASEPATH))
+    expected = [single.accepts(os.path.join(BASEPATH, name)) for name in names]
+    assert expected == parallel.accepts_many(BASEPATH, names)
+    # the pool of threads is kept for the next batches, and not pickled
+    executor = parallel._executor
+    assert expected == parallel.accepts_many(BASEPATH, names)
+    assert executor is parallel._executor
+    assert expected == pickle.loads(pickle.dumps(parallel)).accepts_many(
+        BASEPATH, names
+    )
+    parallel.close()
+    assert parallel._executor is None
+    # small batches are read one file at a time
+    small = ContentTypeFilter("image/*")
+    assert 6 == len(walk_and_filter(BASEPATH, small))
+    assert small._executor is None
+
+
 def test_find_filepath():
     """Test when the root path to a find is a file and not a directory."""
     a_paths = find_paths(os.path.join(BASEPATH, "python_logo.png"), just_files=True)
@@ -346,58 +492,68 @@ def test_find_filepath():
     assert a_paths == b_paths
 
 
-try:
-    import PIL  # noqa: F401
+@requires_pil
+def test_image_dimension():
+    """Find images based on dimensions."""
+    p_filter = ImageDimensionFilter(
+        max_width=1000, max_height=1000, min_height=20, min_width=20
+    )
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 6 == len(paths)
 
-    def test_image_dimension():
-        """Find images based on dimensions."""
-        p_filter = ImageDimensionFilter(
-            max_width=1000, max_height=1000, min_height=20, min_width=20
-        )
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 6 == len(paths)
+    # ignore the 24x24
+    p_filter = ImageDimensionFilter(
+        max_width=1000, max_height=1000, min_height=25, min_width=25
+    )
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 5 == len(paths)
 
-        # ignore the 24x24
-        p_filter = ImageDimensionFilter(
-            max_width=1000, max_height=1000, min_height=25, min_width=25
-        )
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 5 == len(paths)
-
-        # no 24x24, but only check it based on height
-        p_filter = ImageDimensionFilter(min_height=25)
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 5 == len(paths)
-
-        # only the 24x24
-        p_filter = ImageDimensionFilter(max_width=24, max_height=24)
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 1 == len(paths)
-
-        # only the 24x24, but only check it based on height
-        p_filter = ImageDimensionFilter(max_height=24)
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 1 == len(paths)
-
-        # no parameters - all images
-        p_filter = ImageDimensionFilter()
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 6 == len(paths)
-
-    def test_bw_image():
-        """Find all grey scale images."""
-        p_filter = GreyscaleImageFilter()
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 4 == len(paths)
-
-    def test_color_image():
-        """Find all color images."""
-        p_filter = ColorImageFilter()
-        paths = walk_and_filter(BASEPATH, p_filter)
-        assert 2 == len(paths)
+    # no 24x24, but only check it based on height
+    p_filter = ImageDimensionFilter(min_height=25)
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 5 == len(paths)
 
-except ImportError:
-    pass
+    # only the 24x24
+    p_filter = ImageDimensionFilter(max_width=24, max_height=24)
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 1 == len(paths)
+
+    # only the 24x24, but only check it based on height
+    p_filter = ImageDimensionFilter(max_height=24)
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 1 == len(paths)
+
+    # no parameters - all images
+    p_filter = ImageDimensionFilter()
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 6 == len(paths)
+
+
+@requires_pil
+def test_bw_image():
+    """Find all grey scale images."""
+    p_filter = GreyscaleImageFilter()
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 4 == len(paths)
+
+
+@requires_pil
+def test_color_image():
+    """Find all color images."""
+    p_filter = ColorImageFilter()
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 2 == len(paths)
+
+
+@requires_pil
+def test_sniffed_image():
+    """Only decode the files that are images."""
+    p_filter = ImageDimensionFilter(min_height=25, sniff=True)
+    paths = walk_and_filter(BASEPATH, p_filter)
+    assert 5 == len(paths)
+    assert walk_and_filter(BASEPATH, ColorImageFilter()) == walk_and_filter(
+        BASEPATH, ColorImageFilter(sniff=True)
+    )
 
 
 def test_generator():
@@ -439,3 +595,1028 @@ def test_path_does_not_exist():
         find_paths(
             os.path.join(os.path.dirname(BASEPATH), "doesnotexist"), just_dirs=True
         )
+
+
+def test_walk_and_filter_many():
+    """Run several filters over a single walk of the tree."""
+    queries = {
+        "dirs": DirectoryFilter(),
+        "txt": FnmatchFilter("*.txt"),
+        "images": ImageFilter(),
+        "empty": SizeFilter(max_bytes=0),
+    }
+    results = walk_and_filter_many(BASEPATH, queries)
+    assert sorted(results["dirs"]) == sorted(find_paths(BASEPATH, just_dirs=True))
+    assert sorted(results["txt"]) == sorted(find_paths(BASEPATH, fnmatch="*.txt"))
+    assert 6 == len(results["images"])
+    assert 12 == len(results["empty"])
+
+    # limit every query, or just some of them
+    results = walk_and_filter_many(BASEPATH, queries, limit=2)
+    assert all(2 == len(paths) for paths in results.values())
+    results = walk_and_filter_many(BASEPATH, queries, limit={"txt": 1})
+    assert 1 == len(results["txt"])
+    assert 5 == len(results["dirs"])
+
+
+def test_walk_and_filter_many_generator():
+    """Stream the (name, path) pairs of several filters."""
+    queries = {"logs": FnmatchFilter("*.log"), "dat": FnmatchFilter("*.dat")}
+    found = sorted(walk_and_filter_many_generator(BASEPATH, queries))
+    assert [
+        ("dat", os.path.join(BASEPATH, "file2.dat")),
+        ("logs", os.path.join(BASEPATH, "dir1", "file5.log")),
+        ("logs", os.path.join(BASEPATH, "dir2", "file6.log")),
+    ] == found
+
+
+def test_time_filters(tmp_path):
+    """Find paths based on their stat times."""
+    old, new = tmp_path / "old.txt", tmp_path / "new.txt"
+    old.write_text("old")
+    new.write_text("new")
+    os.utime(old, (1000, 1000))
+    os.utime(new, (5000, 5000))
+
+    paths = walk_and_filter(str(tmp_path), ModifiedTimeFilter(after=2000))
+    assert [str(new)] == paths
+    paths = walk_and_filter(str(tmp_path), ModifiedTimeFilter(before=2000))
+    assert [str(old)] == paths
+    paths = walk_and_filter(str(tmp_path), AccessedTimeFilter(after=900, before=1100))
+    assert [str(old)] == paths
+    # the ctime of both files is now
+    assert 2 == len(walk_and_filter(str(tmp_path), ChangedSinceFilter(2000)))
+
+
+def test_find_changed_paths(tmp_path, monkeypatch):
+    """Only find the paths changed since the previous scan."""
+    tree, state = tmp_path / "tree", str(tmp_path / "state.json")
+    (tree / "a").mkdir(parents=True)
+    (tree / "b").mkdir()
+    (tree / "a" / "one.txt").write_text("1")
+    (tree / "b" / "two.txt").write_text("2")
+
+    # pretend the scans run far in the future, so only paths given a later
+    # mtime count as changed
+    now = time.time()
+    monkeypatch.setattr(incremental.time, "time", lambda: now + 1000)
+    assert 4 == len(find_changed_paths(str(tree), state, prune=True))
+    assert [] == find_changed_paths(str(tree), state, prune=True)
+
+    # a new file, and a file modified in place in an unchanged directory
+    (tree / "a" / "three.txt").write_text("3")
+    os.utime(tree / "a" / "three.txt", (now + 2000, now + 2000))
+    os.utime(tree / "b" / "two.txt", (now + 2000, now + 2000))
+    monkeypatch.setattr(incremental.time, "time", lambda: now + 1500)
+    paths = find_changed_paths(str(tree), state, filter=FileFilter(), prune=True)
+    # pruning only finds new or replaced entries, two.txt is missed
+    assert [str(tree / "a" / "three.txt")] == paths
+
+    # without pruning every file is stat-ed
+    other_state = tmp_path / "other_state.json"
+    other_state.write_text(json.dumps({"mark": now + 1500}))
+    paths = find_changed_paths(str(tree), str(other_state), filter=FileFilter())
+    assert 2 == len(paths)
+    assert str(tree / "b" / "two.txt") in paths
+
+
+def test_snapshot(tmp_path):
+    """Save a snapshot of the tree and read it back."""
+    snapshot_path = str(tmp_path / "data.snap")
+    assert 23 == write_snapshot(snapshot_path, BASEPATH)
+    with Snapshot(snapshot_path) as snapshot:
+        entries = list(snapshot)
+        assert 23 == len(snapshot)
+    relpaths = [entry.path for entry in entries]
+    assert sorted(relpaths, key=os.fsencode) == relpaths
+    expected = sorted(os.path.relpath(path, BASEPATH) for path in find_paths(BASEPATH))
+    assert expected == sorted(relpaths)
+    logo = entries[relpaths.index("python_logo.png")]
+    assert os.stat(os.path.join(BASEPATH, "python_logo.png")).st_size == logo.size
+
+    # only record the filtered paths
+    assert 5 == write_snapshot(snapshot_path, BASEPATH, filter=FnmatchFilter("*.txt"))
+
+    class CountingFilter(FnmatchFilter):
+        """Count the batches filtered."""
+
+        batches = 0
+
+        def accepts_many(self, dirpath, names):
+            """Count the batch and filter it."""
+            CountingFilter.batches += 1
+            return super(CountingFilter, self).accepts_many(dirpath, names)
+
+    # each directory is filtered in one batch
+    assert 5 == write_snapshot(snapshot_path, BASEPATH, filter=CountingFilter("*.txt"))
+    assert 2 * len(find_paths(BASEPATH, just_dirs=True)) + 2 == CountingFilter.batches
+
+
+def test_diff_snapshots(tmp_path):
+    """Compare the snapshots of a changing tree."""
+    tree = tmp_path / "tree"
+    (tree / "a").mkdir(parents=True)
+    (tree / "a" / "keep.txt").write_text("keep")
+    (tree / "a" / "change.txt").write_text("change")
+    (tree / "a.txt").write_text("removed")
+    old, new = str(tmp_path / "old.snap"), str(tmp_path / "new.snap")
+    write_snapshot(old, str(tree))
+
+    (tree / "a.txt").unlink()
+    (tree / "a" / "change.txt").write_text("changed contents")
+    (tree / "a" / "sub").mkdir()
+    (tree / "a" / "sub" / "new.txt").write_text("added")
+    write_snapshot(new, str(tree))
+
+    changes = set(diff_snapshots(old, new))
+    assert {
+        ("removed", "a.txt"),
+        ("changed", os.path.join("a", "change.txt")),
+        ("added", os.path.join("a", "sub")),
+        ("added", os.path.join("a", "sub", "new.txt")),
+    } <= changes
+    assert ("changed", os.path.join("a", "keep.txt")) not in changes
+    assert [] == list(diff_snapshots(new, new))
+
+
+def test_pathset():
+    """Return the paths as a PathSet."""
+    paths = find_paths(BASEPATH, pathset=True)
+    assert isinstance(paths, PathSet)
+    assert 23 == len(paths)
+    assert sorted(find_paths(BASEPATH)) == sorted(paths)
+    assert sorted(paths) == list(paths.iter_sorted())
+    assert os.path.join(BASEPATH, "dir1", "file4.txt") in paths
+    assert os.path.join(BASEPATH, "dir1", "file4") not in paths
+    # a directory of a path is only a member if it was found itself
+    assert BASEPATH not in paths
+
+    dirs = find_paths(BASEPATH, just_dirs=True, pathset=True)
+    files = find_paths(BASEPATH, just_files=True, pathset=True)
+    assert paths == dirs | files
+    assert 0 == len(dirs & files)
+    assert files == paths - dirs
+    assert dirs <= paths
+
+    dirs.discard(os.path.join(BASEPATH, "dir1"))
+    assert 4 == len(dirs)
+    assert os.path.join(BASEPATH, "dir1", "subdirectory") in dirs
+    dirs.discard(os.path.join(BASEPATH, "dir1", "subdirectory"))
+    assert [] == [path for path in dirs if "dir1" in path]
+
+
+def test_pathset_sorted():
+    """Iterate over a PathSet in string order."""
+    paths = ["a.txt", os.path.join("a", "b"), "a", "a0", os.path.join("a", "b", "c")]
+    assert sorted(paths) == list(PathSet(paths).iter_sorted())
+    assert set(paths) == set(PathSet(paths))
+
+
+def test_accepts_many():
+    """Evaluate filters over a whole directory listing."""
+    names = sorted(os.listdir(BASEPATH))
+    paths = [os.path.join(BASEPATH, name) for name in names]
+    for path_filter in [
+        DirectoryFilter(),
+        FileFilter(),
+        RegexFilter(".*2.*"),
+        FnmatchFilter("*.txt"),
+        DirectoryFilter() & RegexFilter(".*2.*"),
+        DirectoryFilter() | FnmatchFilter("*.gif"),
+        NotFilter(FnmatchFilter("*.png")),
+        DotDirectoryFilter(),
+        SizeFilter(min_bytes=1),
+        ImageFilter(),
+        ModifiedTimeFilter(after=1000),
+        ChangedSinceFilter(1000) & FnmatchFilter("*.txt"),
+        Query("name:*.txt and mtime>7d").filter,
+    ]:
+        assert supports_batch(path_filter)
+        expected = [path_filter.accepts(path) for path in paths]
+        assert expected == path_filter.accepts_many(BASEPATH, names)
+
+
+def test_walk_uses_batches():
+    """Only use accepts_many if every filter in the tree supports it."""
+
+    class CountingFilter(FnmatchFilter):
+        """Count the accepts_many calls."""
+
+        batch_calls = 0
+
+        def accepts_many(self, dirpath, names):
+            """Count the call."""
+            CountingFilter.batch_calls += 1
+            return super(CountingFilter, self).accepts_many(dirpath, names)
+
+    class PlainFilter(Filter):
+        """A filter without accepts_many."""
+
+        def accepts(self, filepath):
+            """Return True."""
+            return True
+
+    paths = find_paths(BASEPATH, filter=CountingFilter("*.txt") & FileFilter())
+    assert sorted(find_paths(BASEPATH, fnmatch="*.txt")) == sorted(paths)
+    assert CountingFilter.batch_calls > 0
+
+    CountingFilter.batch_calls = 0
+    path_filter = CountingFilter("*.txt") & PlainFilter()
+    assert not supports_batch(path_filter)
+    assert 5 == len(find_paths(BASEPATH, filter=path_filter))
+    assert 0 == CountingFilter.batch_calls
+
+
+def test_subclass_overriding_accepts():
+    """Filter a path at a time with a subclass overriding only accepts."""
+
+    class TextFileFilter(FileFilter):
+        """Accept text files."""
+
+        def accepts(self, filepath):
+            """Return True for the files ending in .txt."""
+            return super(TextFileFilter, self).accepts(filepath) and filepath.endswith(
+                ".txt"
+            )
+
+    class GifFilter(ImageFilter):
+        """Accept gif images."""
+
+        def accepts(self, filepath):
+            """Return True for the images ending in .gif."""
+            return super(GifFilter, self).accepts(filepath) and filepath.endswith(
+                ".gif"
+            )
+
+    assert not supports_batch(TextFileFilter())
+    assert not supports_batch(TextFileFilter() & FnmatchFilter("*"))
+    assert 5 == len(find_paths(BASEPATH, filter=TextFileFilter()))
+    assert 2 == len(find_paths(BASEPATH, filter=GifFilter()))
+    assert supports_batch(SizeFilter(min_bytes=1))
+
+
+def test_archive_source(tmp_path):
+    """Walk the members of zip and tar archives."""
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as archive:
+        archive.writestr("logs/app.log", "zipped log")
+        archive.writestr("readme.txt", "")
+    with tarfile.open(tmp_path / "bundle.tar.gz", "w:gz") as archive:
+        archive.add(os.path.join(BASEPATH, "dir1"), arcname="dir1")
+    (tmp_path / "plain.log").write_text("log")
+
+    source = ArchiveSource()
+    paths = find_paths(str(tmp_path), fnmatch="*.log", source=source)
+    assert sorted(
+        [
+            str(tmp_path / "plain.log"),
+            str(tmp_path / "bundle.zip" / "logs" / "app.log"),
+            str(tmp_path / "bundle.tar.gz" / "dir1" / "file5.log"),
+        ]
+    ) == sorted(paths)
+    paths = find_paths(str(tmp_path), filter=SizeFilter(min_bytes=1), source=source)
+    assert sorted(
+        [str(tmp_path / "plain.log"), str(tmp_path / "bundle.zip" / "logs" / "app.log")]
+    ) == sorted(paths)
+    assert str(tmp_path / "bundle.tar.gz" / "dir1" / "subdirectory") in find_paths(
+        str(tmp_path), just_dirs=True, source=source
+    )
+    # without the archive source archives are files
+    assert 3 == len(find_paths(str(tmp_path), just_files=True))
+
+    class ContentsFilter(Filter):
+        """Accept files containing zipped."""
+
+        def accepts(self, filepath):
+            """Return True if the file contains zipped."""
+            if not is_file(filepath):
+                return False
+            contents = open_path(filepath)
+            if isinstance(contents, str):
+                contents = open(contents, "rb")
+            with contents:
+                return b"zipped" in contents.read()
+
+    paths = find_paths(str(tmp_path), filter=ContentsFilter(), source=source)
+    assert [str(tmp_path / "bundle.zip" / "logs" / "app.log")] == paths
+
+
+def test_archive_source_reads(tmp_path, monkeypatch, caplog):
+    """Read members from the open archive, and skip broken archives."""
+    with tarfile.open(tmp_path / "bundle.tar.gz", "w:gz") as archive:
+        archive.add(BASEPATH, arcname="data")
+    (tmp_path / "broken.zip").write_bytes(b"not a zip")
+
+    opened = []
+    tarfile_open = tarfile.open
+
+    def counting_open(*args, **kwargs):
+        """Count the archives opened."""
+        opened.append(args[0])
+        return tarfile_open(*args, **kwargs)
+
+    monkeypatch.setattr(tarfile, "open", counting_open)
+    source = ArchiveSource()
+    with caplog.at_level(logging.WARNING, logger="pathfinder"):
+        paths = find_paths(
+            str(tmp_path), filter=ContentTypeFilter("image/*"), source=source
+        )
+    assert 6 == len(paths)
+    assert 1 == len(opened)
+    assert "broken.zip" in caplog.text
+    assert str(tmp_path / "broken.zip") not in find_paths(
+        str(tmp_path), just_files=True, source=source
+    )
+    source.close()
+
+
+def test_archive_source_parallel(tmp_path):
+    """Share an archive source between the threads of parallel walks."""
+    for number in range(4):
+        with tarfile.open(tmp_path / f"bundle{number}.tar", "w") as archive:
+            archive.add(BASEPATH, arcname="data")
+        with zipfile.ZipFile(tmp_path / f"bundle{number}.zip", "w") as archive:
+            for path in find_paths(BASEPATH, just_files=True):
+                archive.write(path, os.path.relpath(path, BASEPATH))
+    tree = str(tmp_path)
+    images = ContentTypeFilter("image/*")
+    expected = sorted(find_paths(tree, filter=images, source=ArchiveSource()))
+    assert 48 == len(expected)
+    # one archive kept open, so the threads drop and read the archives again
+    for max_archives in (1, 8):
+        source = ArchiveSource(max_archives=max_archives)
+        paths = parallel_walk_and_filter(tree, images, max_workers=4, source=source)
+        assert expected == sorted(paths)
+        assert expected == list(
+            sorted_walk_and_filter(
+                tree, images, source=source, max_workers=4, run_size=10
+            )
+        )
+        source.close()
+
+
+def test_resumable_walk(tmp_path):
+    """Stop a walk part of the way through and resume it."""
+    state_path = str(tmp_path / "walk.json")
+    walk = resumable_walk(BASEPATH, FileFilter(), state_path, checkpoint_every=1)
+    first = [next(walk) for _ in range(7)]
+    walk.close()
+
+    rest = list(resumable_walk(BASEPATH, FileFilter(), state_path, checkpoint_every=1))
+    assert 18 == len(first + rest)
+    assert sorted(find_paths(BASEPATH, just_files=True)) == sorted(first + rest)
+    # the walk is complete
+    assert [] == list(resumable_walk(BASEPATH, FileFilter(), state_path))
+
+    with pytest.raises(ValueError):
+        list(resumable_walk(os.path.join(BASEPATH, "dir1"), FileFilter(), state_path))
+    remove_state(state_path)
+    assert 18 == len(list(resumable_walk(BASEPATH, FileFilter(), state_path)))
+
+
+def test_resumable_walk_shards(tmp_path):
+    """Split a resumable walk between workers."""
+    paths = []
+    for shard in range(3):
+        state_path = str(tmp_path / f"walk{shard}.json")
+        paths.extend(
+            resumable_walk(
+                BASEPATH, AlwaysAcceptFilter(), state_path, shard=shard, shards=3
+            )
+        )
+    assert sorted(find_paths(BASEPATH)) == sorted(paths)
+
+
+def test_token_bucket():
+    """Wait for the tokens to be available."""
+    bucket = TokenBucket(rate=200, capacity=1)
+    started = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_io_budget_adapts(monkeypatch):
+    """Adapt the concurrency to the latency of the calls."""
+    clock = [0.0]
+
+    class Clock:
+        """A clock that only moves during the calls, that never sleeps."""
+
+        @staticmethod
+        def monotonic():
+            """Return the time."""
+            return clock[0]
+
+        @staticmethod
+        def sleep(_):
+            """Do not sleep."""
+
+    def call(latency):
+        """Make a stat call taking latency seconds."""
+        with budget.call("stat"):
+            clock[0] += latency
+
+    monkeypatch.setattr(throttle, "time", Clock)
+    budget = IOBudget(target_latency=0.01, max_concurrency=8)
+    call(0.1)
+    assert 4 == budget.concurrency
+    for _ in range(10):
+        call(0.1)
+    assert 1 == budget.concurrency
+    assert budget.delay > 0
+    for _ in range(100):
+        call(0.0)
+    assert 0 == budget.delay
+    assert 8 == budget.concurrency
+    assert 111 == budget.calls
+
+
+def test_throttled_source():
+    """Walk the tree within an I/O budget."""
+    budget = IOBudget(listings_per_second=1000, stats_per_second=1000)
+    source = ThrottledSource(budget)
+    paths = find_paths(BASEPATH, filter=SizeFilter(min_bytes=1), source=source)
+    assert sorted(find_paths(BASEPATH, filter=SizeFilter(min_bytes=1))) == sorted(paths)
+    # 6 listings and a stat for each file
+    assert 6 + 18 == budget.calls
+
+    class HeaderFilter(Filter):
+        """Accept GIF files."""
+
+        def accepts(self, filepath):
+            """Return True if the file starts with the GIF signature."""
+            if not is_file(filepath):
+                return False
+            with open_path(filepath) as contents:
+                return contents.read(3) == b"GIF"
+
+    # the reads are charged to the budget too, for the bytes read
+    budget = IOBudget(listings_per_second=1000, bytes_per_second=1000000)
+    charged = []
+    acquire = budget.buckets["read"].acquire
+    budget.buckets["read"].acquire = lambda amount: charged.append(amount)
+    source = ThrottledSource(budget)
+    paths = find_paths(BASEPATH, filter=HeaderFilter(), source=source)
+    assert 2 == len(paths)
+    assert 6 + 18 == budget.calls
+    sizes = [os.stat(path).st_size for path in find_paths(BASEPATH, just_files=True)]
+    assert sum(min(3, size) for size in sizes) == sum(charged)
+    budget.buckets["read"].acquire = acquire
+    images = ContentTypeFilter("image/*", workers=1)
+    assert 6 == len(find_paths(BASEPATH, filter=images, source=source))
+
+
+def test_top_paths(tmp_path):
+    """Find the largest, newest and oldest files."""
+    for size in range(1, 8):
+        path = tmp_path / f"file{size}.dat"
+        path.write_bytes(b"x" * size * 100)
+        os.utime(path, (size * 1000, (8 - size) * 1000))
+    (tmp_path / "empty.log").write_bytes(b"")
+    os.utime(tmp_path / "empty.log", (1, 1))
+    tree = str(tmp_path)
+
+    assert [str(tmp_path / "file7.dat"), str(tmp_path / "file6.dat")] == largest_paths(
+        tree, 2
+    )
+    assert [str(tmp_path / "file1.dat")] == newest_paths(tree, 1)
+    assert [str(tmp_path / "empty.log"), str(tmp_path / "file7.dat")] == oldest_paths(
+        tree, 2
+    )
+    assert [str(tmp_path / "file1.dat")] == oldest_paths(
+        tree, 1, filter=FnmatchFilter("*.dat") & ModifiedTimeFilter(after=7000)
+    )
+    assert 8 == len(largest_paths(tree, 100))
+
+    # any key
+    paths = top_paths(
+        tree, 3, lambda path, stat: path[-5], filter=FnmatchFilter("*.dat")
+    )
+    assert [str(tmp_path / f"file{n}.dat") for n in (7, 6, 5)] == paths
+    assert [] == top_paths(tree, 0, lambda path, stat: 0)
+
+
+def test_hamming_index():
+    """Find the hashes within a few bits of a hash."""
+    index = HammingIndex(64, 4)
+    base = 0x0123456789ABCDEF
+    assert 0 == index.add(base)
+    assert 1 == index.add(base ^ 0b1011)
+    assert 2 == index.add(base ^ 0xF0F0)
+    assert 3 == index.add(~base & (1 << 64) - 1)
+    assert 4 == len(index)
+    assert 3 == hamming_distance(base, base ^ 0b1011)
+    assert [0, 1] == index.near(base)
+    assert [0, 1] == index.near(base ^ 1)
+    assert [2] == index.near(base ^ 0xF0F1)
+    assert [3] == index.near(~base & (1 << 64) - 1)
+
+    # every pair within the distance is found
+    index = HammingIndex(16, 3)
+    values = list(range(0, 1 << 16, 97))
+    for value in values:
+        index.add(value)
+    for value in values[:50]:
+        expected = [
+            ident
+            for ident, other in enumerate(values)
+            if hamming_distance(value, other) <= 3
+        ]
+        assert expected == index.near(value)
+
+    # every hash is within a distance of the number of bits
+    for max_distance in (4, 5):
+        index = HammingIndex(4, max_distance)
+        index.add(0b0000)
+        index.add(0b0110)
+        assert [0, 1] == index.near(0b1111)
+
+
+@requires_numpy
+@requires_pil
+def test_find_similar_images():
+    """Group the copies of an image saved in different formats."""
+    groups = find_similar_images(BASEPATH, processes=1)
+    logos = [
+        os.path.join(BASEPATH, "python_logo.gif"),
+        os.path.join(BASEPATH, "python_logo.png"),
+    ]
+    assert any(set(logos) <= set(group) for group in groups)
+    assert groups == find_similar_images(BASEPATH, processes=2)
+
+
+@requires_numpy
+def test_find_records(tmp_path):
+    """Export the paths and their stat as records."""
+    records, table = find_records(BASEPATH, chunk_size=4)
+    paths = find_paths(BASEPATH)
+    assert len(paths) == len(records)
+    assert paths == [table.path(ident) for ident in records["path_id"]]
+    assert [table.path(ident) for ident in records["parent_id"]] == [
+        os.path.dirname(path) for path in paths
+    ]
+    stat = os.stat(os.path.join(BASEPATH, "python_logo.png"))
+    (row,) = records[records["inode"] == stat.st_ino]
+    assert stat.st_size == row["size"]
+    assert stat.st_mtime_ns == row["mtime_ns"]
+    assert stat.st_mode == row["mode"]
+
+    # written in chunks as the walk goes
+    csv_path, npy_path = tmp_path / "paths.csv", tmp_path / "paths.npy"
+    records, table = find_records(
+        BASEPATH,
+        filter=FileFilter(),
+        abspath=True,
+        chunk_size=3,
+        csv_path=csv_path,
+        npy_path=npy_path,
+    )
+    assert (records == numpy.load(npy_path)).all()
+    lines = csv_path.read_text().splitlines()
+    assert "path,path_id,parent_id,size,mtime_ns,mode,inode" == lines[0]
+    assert find_paths(BASEPATH, just_files=True, abspath=True) == [
+        line.split(",")[0] for line in lines[1:]
+    ]
+
+
+@requires_numpy
+def test_find_records_current_directory(tmp_path, monkeypatch):
+    """Export the records of the current directory."""
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "sub" / "b.txt").write_text("b")
+    monkeypatch.chdir(tmp_path)
+    records, table = find_records(".")
+    assert 3 == len(records)
+    assert {"a.txt", "sub", os.path.join("sub", "b.txt")} == {
+        table.path(ident) for ident in records["path_id"]
+    }
+    assert {".", "sub"} == {table.path(ident) for ident in records["parent_id"]}
+
+
+def test_query():
+    """Find paths with a query string."""
+    assert find_paths(BASEPATH, just_files=True) == find_query(BASEPATH, "type:file")
+    assert 5 == len(find_query(BASEPATH, "name:*.txt"))
+    assert 3 == len(find_query(BASEPATH, "ext:gif or ext:.jpg and name:*_gs*"))
+    assert 3 == len(find_query(BASEPATH, "size>=450 size<=9000"))
+    assert 0 == len(find_query(BASEPATH, "mtime<1d and mtime>1d"))
+    assert 2 == len(find_query(BASEPATH, 'content:image/gif and not (name:"x y")'))
+
+    # the planner runs the cheap predicates first and prunes the walk
+    dir1 = os.path.join(BASEPATH, "dir1")
+    query = Query(f"size>1K and not path:{dir1}{os.sep} and name:file*")
+    assert isinstance(query.filter[0], NameFilter)
+    assert isinstance(query.filter[-1], SizeFilter)
+    assert query.ignore.accepts(os.path.join(dir1, "subdirectory"))
+    assert not query.ignore.accepts(dir1 + "0")
+    assert [dir1] == query.prune
+    explained = query.explain()
+    assert explained.startswith("and  (cost 1.35, selectivity 0.01)")
+    assert f"prune {dir1}" in explained
+    assert [
+        path for path in find_paths(BASEPATH, just_files=True) if dir1 not in path
+    ] == Query(f"type:file not path:{dir1}").find(BASEPATH)
+
+    for text in ("", "name:", "foo:bar", "size:1", "(name:x", "name:x )", "size>x"):
+        with pytest.raises(QuerySyntaxError):
+            Query(text)
+
+
+def test_estimate_paths(tmp_path):
+    """Estimate the paths accepted from a sample of directories."""
+    # a regular tree is estimated exactly
+    for top in range(3):
+        for sub in range(2):
+            directory = tmp_path / f"top{top}" / f"sub{sub}"
+            directory.mkdir(parents=True)
+            for number in range(4):
+                (directory / f"{number}.tmp").write_bytes(b"x" * 10)
+            (directory / "keep.dat").write_bytes(b"x")
+    estimate = estimate_paths(str(tmp_path), filter=FnmatchFilter("*.tmp"), seed=1)
+    assert (24.0, 24.0, 24.0) == estimate.count
+    assert (240.0, 240.0, 240.0) == estimate.size
+    assert 1000 == estimate.samples
+    assert 10 == estimate.listings
+
+    # an irregular one within the confidence interval
+    (tmp_path / "top0" / "sub0" / "deeper").mkdir()
+    for number in range(20):
+        (tmp_path / "top0" / "sub0" / "deeper" / f"{number}.tmp").write_bytes(b"")
+    estimate = estimate_paths(str(tmp_path), filter=FnmatchFilter("*.tmp"), seed=1)
+    assert estimate.count.low < 44 < estimate.count.high
+    assert estimate.count.low < estimate.count.estimate < estimate.count.high
+    assert 11 == estimate.listings
+
+    # within a budget
+    estimate = estimate_paths(str(tmp_path), max_listings=2, seed=1)
+    assert 2 == estimate.listings
+    assert 0 == estimate.samples
+    assert 0 == estimate.count.estimate
+    estimate = estimate_paths(str(tmp_path), depth=1, max_listings=1)
+    assert (3.0, 3.0, 3.0) == estimate.count
+
+
+def test_progress(tmp_path, caplog):
+    """Report the progress of a walk."""
+    events = []
+    progress = Progress(events.append, interval=0)
+    paths = find_paths(BASEPATH, fnmatch="*.txt", progress=progress)
+    assert 7 == len(events) == progress.events
+    assert [False] * 6 + [True] == [event.done for event in events]
+    last = events[-1]
+    assert 6 == last.directories
+    assert len(find_paths(BASEPATH)) == last.entries
+    assert len(paths) == last.matches
+    assert 0 == last.frontier
+    assert sorted(event.entries for event in events) == [
+        event.entries for event in events
+    ]
+
+    # only every interval, and the bytes the filters read
+    for number in range(3):
+        (tmp_path / f"{number}.bin").write_bytes(b"x" * 1000)
+    (tmp_path / "small.bin").write_bytes(b"x" * 10)
+    events = []
+    progress = Progress(events.append, interval=3600)
+    walk_and_filter(str(tmp_path), ContentTypeFilter("image/*"), progress=progress)
+    assert 1 == len(events)
+    assert 3 * SNIFF_SIZE + 10 == events[0].bytes_read
+
+    with caplog.at_level(logging.INFO, logger="pathfinder"):
+        walk_and_filter_many(
+            BASEPATH, {"all": FileFilter()}, progress=Progress(log_progress())
+        )
+    assert caplog.records[-1].getMessage().startswith("done: 6 directories")
+
+
+def test_relative_paths():
+    """Find paths relative to the directory searched."""
+    paths = find_paths(BASEPATH, just_files=True)
+    relative = find_paths(BASEPATH, just_files=True, relative=True)
+    assert [os.path.relpath(path, BASEPATH) for path in paths] == relative
+    assert [
+        os.path.relpath(path, BASEPATH) for path in find_paths(BASEPATH, regex=".*dir")
+    ] == find_paths(BASEPATH, regex=".*dir", relative=True)
+    regex = r".*dir1(/subdirectory)?$"
+    assert ["dir1", os.path.join("dir1", "subdirectory")] == find_paths(
+        BASEPATH, regex=regex, relative=True
+    )
+    with pytest.raises(ValueError):
+        find_paths(BASEPATH, abspath=True, relative=True)
+
+
+def test_bytes_paths(tmp_path):
+    """Walk with bytes paths, keeping names that are not valid unicode."""
+    tree = os.fsencode(tmp_path)
+    os.mkdir(os.path.join(tree, b"sub"))
+    for name in (b"caf\xe9.txt", b"sub/plain.txt", b"sub/other.dat"):
+        with open(os.path.join(tree, name), "wb") as bytes_file:
+            bytes_file.write(b"x")
+
+    paths = find_paths(tree, fnmatch="*.txt")
+    assert [
+        os.path.join(tree, b"caf\xe9.txt"),
+        os.path.join(tree, b"sub/plain.txt"),
+    ] == sorted(paths)
+    assert [b"caf\xe9.txt"] == find_paths(tree, regex=r".*/caf.\.txt$", relative=True)
+    assert [b"sub", b"sub/plain.txt"] == sorted(
+        walk_and_filter(
+            tree,
+            NameFilter("[ps]*") & NotFilter(SizeFilter(min_bytes=2)),
+            relative=True,
+        )
+    )
+    assert find_paths(str(tmp_path), fnmatch="*.txt") == [
+        os.fsdecode(path) for path in paths
+    ]
+
+
+def test_bytes_path_set():
+    """Collect bytes paths in a PathSet."""
+    tree = os.fsencode(BASEPATH)
+    paths = find_paths(tree, pathset=True)
+    assert sorted(find_paths(tree)) == list(paths.iter_sorted())
+    assert os.path.join(tree, b"dir1", b"file4.txt") in paths
+    assert os.path.join(BASEPATH, "dir1", "file4.txt") not in paths
+    paths.discard(os.path.join(tree, b"dir1", b"file4.txt"))
+    assert len(find_paths(tree)) - 1 == len(paths)
+
+
+def test_bytes_archive_source(tmp_path):
+    """Walk archives with bytes paths."""
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as archive:
+        archive.writestr("logs/app.log", "zipped log")
+    paths = find_paths(os.fsencode(tmp_path), fnmatch="*.log", source=ArchiveSource())
+    assert [os.fsencode(tmp_path / "bundle.zip" / "logs" / "app.log")] == paths
+
+
+def test_bytes_resumable_walk(tmp_path):
+    """Stop and resume a walk with bytes paths."""
+    tree, state_path = os.fsencode(BASEPATH), str(tmp_path / "walk.json")
+    walk = resumable_walk(tree, FileFilter(), state_path, checkpoint_every=1)
+    first = [next(walk) for _ in range(7)]
+    walk.close()
+    rest = list(resumable_walk(tree, FileFilter(), state_path, checkpoint_every=1))
+    assert sorted(find_paths(tree, just_files=True)) == sorted(first + rest)
+
+
+@requires_numpy
+def test_bytes_find_records(tmp_path):
+    """Export the records of a walk with bytes paths."""
+    csv_path = tmp_path / "paths.csv"
+    records, table = find_records(os.fsencode(BASEPATH), csv_path=csv_path)
+    paths = find_paths(os.fsencode(BASEPATH))
+    assert paths == [table.path(ident) for ident in records["path_id"]]
+    lines = csv_path.read_text().splitlines()
+    assert [os.fsdecode(path) for path in paths] == [
+        line.split(",")[0] for line in lines[1:]
+    ]
+
+
+def test_bytes_find_changed_paths(tmp_path, monkeypatch):
+    """Find the changed paths of a tree given as bytes, pruning its directories."""
+    tree, state = tmp_path / "tree", str(tmp_path / "state.json")
+    (tree / "a").mkdir(parents=True)
+    (tree / "a" / "one.txt").write_text("1")
+    now = time.time()
+    monkeypatch.setattr(incremental.time, "time", lambda: now + 1000)
+    paths = find_changed_paths(os.fsencode(tree), state, prune=True)
+    assert sorted([os.fsencode(tree / "a"), os.fsencode(tree / "a" / "one.txt")]) == (
+        sorted(paths)
+    )
+    assert [] == find_changed_paths(os.fsencode(tree), state, prune=True)
+    assert str(tree / "a") in json.loads(open(state).read())["dirs"]
+
+
+def test_one_filesystem(monkeypatch):
+    """Do not descend into directories on other devices."""
+    assert find_paths(BASEPATH) == find_paths(BASEPATH, one_filesystem=True)
+
+    get_device = pathfinder._get_device
+
+    def fake_device(path_or_entry):
+        """Put dir1 on a device of its own."""
+        if getattr(path_or_entry, "name", None) == "dir1":
+            return -1
+        return get_device(path_or_entry)
+
+    monkeypatch.setattr(pathfinder, "_get_device", fake_device)
+    paths = find_paths(BASEPATH, one_filesystem=True)
+    assert os.path.join(BASEPATH, "dir1") in paths
+    assert [
+        path
+        for path in find_paths(BASEPATH)
+        if not path.startswith(os.path.join(BASEPATH, "dir1", ""))
+    ] == paths
+
+
+def test_parallel_walk():
+    """Walk with worker threads, scheduled per device."""
+    # the depths at which the walk does not stop before its last directories
+    for depth in (None, 1, 3):
+        assert sorted(find_paths(BASEPATH, depth=depth)) == sorted(
+            parallel_walk_and_filter(BASEPATH, AlwaysAcceptFilter(), depth=depth)
+        )
+    device = os.stat(BASEPATH).st_dev
+    paths = parallel_walk_and_filter(
+        BASEPATH,
+        FnmatchFilter("*.txt"),
+        abspath=True,
+        one_filesystem=True,
+        device_limits={BASEPATH: 1},
+        max_workers=2,
+    )
+    assert sorted(find_paths(BASEPATH, fnmatch="*.txt", abspath=True)) == sorted(paths)
+    # the path is checked when the walk is created, not when it starts
+    with pytest.raises(EnvironmentError):
+        parallel_walk_and_filter(os.path.join(BASEPATH, "doesnotexist"), FileFilter())
+
+    scheduler = DeviceScheduler({device: 2, 7: 1}, default_limit=3)
+    assert 2 == scheduler.limit(device)
+    assert 3 == scheduler.limit(8)
+    for number in range(4):
+        scheduler.add(f"a{number}", device)
+        scheduler.add(f"b{number}", 7)
+    assert [("a3", device), ("b3", 7), ("a2", device)] == scheduler.ready(8)
+    assert [] == scheduler.ready(8)
+    scheduler.finished(7)
+    assert [("b2", 7)] == scheduler.ready(8)
+    assert scheduler
+
+
+def test_listing_cache(tmp_path, monkeypatch):
+    """Reuse the listings of directories that have not changed."""
+    cache = ListingCache(min_age=0)
+    paths = find_paths(BASEPATH, source=cache)
+    assert find_paths(BASEPATH) == paths
+    assert (0, 6, 0, 0, 6, 23) == cache.stats()
+    assert paths == find_paths(BASEPATH, source=cache)
+    assert paths == FnmatchFilter("*").find(BASEPATH, source=cache)
+    assert (12, 6, 0, 0, 6, 23) == cache.stats()
+    assert 2 / 3 == cache.hit_rate
+
+    # a changed directory is listed again, and file stats are never stale
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "file.txt").write_bytes(b"x")
+    tree, sub = str(tmp_path), str(tmp_path / "sub")
+    os.utime(sub, (1, 1))
+    find_paths(tree, source=cache)
+    (tmp_path / "sub" / "file.txt").write_bytes(b"xx")
+    assert [os.path.join(sub, "file.txt")] == find_paths(
+        tree, filter=SizeFilter(min_bytes=2), source=cache
+    )
+    (tmp_path / "new.txt").write_bytes(b"")
+    os.utime(sub, (1, 1))
+    assert 3 == len(find_paths(tree, source=cache))
+    assert 1 == cache.stats().invalidations
+
+    # evicted, least recently used first, or expired
+    cache = ListingCache(max_entries=3, min_age=0)
+    find_paths(BASEPATH, source=cache)
+    assert 0 < cache.stats().evictions
+    assert 3 >= cache.stats().entries
+    cache = ListingCache(ttl=0, min_age=0)
+    find_paths(BASEPATH, source=cache)
+    find_paths(BASEPATH, source=cache)
+    assert 0 == cache.stats().hits
+    assert 6 == cache.stats().invalidations
+
+    # recently modified directories are not cached
+    cache = ListingCache()
+    find_paths(tree, source=cache)
+    assert 1 == cache.stats().listings
+
+    # concurrent misses list a directory once
+    class SlowSource(FileSystemSource):
+        """List directories slowly, counting the listings."""
+
+        calls = 0
+
+        def scandir(self, dirpath):
+            """Return the entries of dirpath, after a while."""
+            SlowSource.calls += 1
+            time.sleep(0.1)
+            return super(SlowSource, self).scandir(dirpath)
+
+    cache = ListingCache(SlowSource(), min_age=0)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        listings = list(executor.map(cache.scandir, [BASEPATH] * 4))
+    assert 1 == SlowSource.calls
+    assert 1 == len({tuple(entry.name for entry in listing) for listing in listings})
+
+    # a miss between the listing handed over and cached does not list again
+    succeed = pathfinder.cache._Flight.succeed
+    late = []
+
+    def succeed_then_miss(flight, listing):
+        """Hand over the listing, then miss the directory once from another thread."""
+        succeed(flight, listing)
+        if not late:
+            late.append(flight)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(cache.scandir, tree).result()
+
+    monkeypatch.setattr(pathfinder.cache._Flight, "succeed", succeed_then_miss)
+    SlowSource.calls = 0
+    cache = ListingCache(SlowSource(), min_age=0)
+    cache.scandir(tree)
+    assert 1 == SlowSource.calls
+    assert 1 == len(late)
+
+
+def test_sharded_walk():
+    """Walk with worker processes sharing out the directories."""
+    assert sorted(find_paths(BASEPATH)) == sorted(
+        sharded_walk_and_filter(
+            BASEPATH, AlwaysAcceptFilter(), processes=2, chunk_size=1
+        )
+    )
+    # filters are pickled, or built from a query in the workers
+    expected = sorted(find_paths(BASEPATH, filter=ImageFilter() | SizeFilter(1)))
+    assert expected == sorted(
+        sharded_walk_and_filter(
+            BASEPATH, ImageFilter() | SizeFilter(1), processes=2, chunk_size=2
+        )
+    )
+    assert sorted(find_paths(BASEPATH, fnmatch="*.txt", depth=1)) == sorted(
+        sharded_walk_and_filter(BASEPATH, "ext:txt", depth=1, processes=2)
+    )
+    assert 2 == len(
+        list(
+            sharded_walk_and_filter(
+                BASEPATH, ContentTypeFilter("image/gif"), depth=1, processes=1
+            )
+        )
+    )
+    with pytest.raises(EnvironmentError):
+        sharded_walk_and_filter(os.path.join(BASEPATH, "doesnotexist"), FileFilter())
+
+    # from find_paths
+    assert sorted(find_paths(BASEPATH, fnmatch="*.txt", abspath=True)) == sorted(
+        find_paths(BASEPATH, fnmatch="*.txt", abspath=True, processes=2)
+    )
+    assert set(find_paths(BASEPATH)) == set(find_paths(BASEPATH, processes=2))
+    with pytest.raises(ValueError):
+        find_paths(BASEPATH, relative=True, processes=2)
+
+
+def test_sharded_walk_sources(tmp_path):
+    """Send picklable sources to the worker processes, and reject the others."""
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as archive:
+        archive.writestr("logs/app.log", "zipped log")
+    (tmp_path / "plain.log").write_text("log")
+    tree = str(tmp_path)
+    archives = ArchiveSource()
+    for source in (archives, ListingCache(archives)):
+        expected = sorted(find_paths(tree, fnmatch="*.log", source=source))
+        assert 2 == len(expected)
+        copy = pickle.loads(pickle.dumps(source))
+        assert expected == sorted(find_paths(tree, fnmatch="*.log", source=copy))
+        assert expected == sorted(
+            sharded_walk_and_filter(tree, "name:*.log", processes=2, source=source)
+        )
+    archives.close()
+    with pytest.raises(TypeError):
+        sharded_walk_and_filter(tree, FileFilter(), source=ThrottledSource(IOBudget()))
+
+
+def test_sorted_walk(tmp_path):
+    """Walk in sorted order, and sort parallel walks in spilled runs."""
+    for name in ("a", "a b", "a-b", "a.b", "a0"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "z").write_bytes(b"")
+    (tmp_path / "a" / "b").mkdir()
+    tree = str(tmp_path)
+    expected = sorted(find_paths(tree))
+    assert expected == list(sorted_walk_and_filter(tree, AlwaysAcceptFilter()))
+    assert expected == list(
+        sorted_walk_and_filter(
+            tree, AlwaysAcceptFilter(), abspath=True, max_workers=2, run_size=2
+        )
+    )
+    expected = sorted(find_paths(BASEPATH, abspath=True, fnmatch="*.txt"))
+    assert expected == list(
+        sorted_walk_and_filter(BASEPATH, FnmatchFilter("*.txt"), abspath=True)
+    )
+    assert expected == [
+        os.path.abspath(path)
+        for path in sorted_walk_and_filter(BASEPATH, FnmatchFilter("*.txt"))
+    ]
+    assert list(
+        sorted_walk_and_filter(BASEPATH, AlwaysAcceptFilter(), depth=2)
+    ) == list(
+        sorted_walk_and_filter(
+            BASEPATH, AlwaysAcceptFilter(), depth=2, max_workers=2, run_size=3
+        )
+    )
+
+    with pytest.raises(EnvironmentError):
+        sorted_walk_and_filter(str(tmp_path / "doesnotexist"), FileFilter())
+
+    paths = ["b", "a/c", "a", "a.b", "c", "a/b", "b/a"]
+    assert sorted(paths) == list(external_sort(paths, run_size=2))
+    assert sorted(paths) == list(external_sort(paths))
+    paths = [os.fsencode(path) for path in paths]
+    assert sorted(paths) == list(external_sort(paths, run_size=3))
+    assert [] == list(external_sort([], run_size=1))